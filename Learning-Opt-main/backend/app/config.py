@@ -61,4 +61,75 @@ def execute_query(query, params=None):
         return cursor.rowcount
     finally:
         cursor.close()
-        connection.close()
\ No newline at end of file
+        connection.close()
+
+def fetch_one(query, params=None):
+    """First row of a SELECT as a dict, or None when nothing matches."""
+    connection = connection_pool.get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        cursor.fetchall()  # drain the rest so the pooled connection is reusable
+        return row
+    finally:
+        cursor.close()
+        connection.close()
+
+def execute_insert(query, params=None):
+    """Run an INSERT and return the AUTO_INCREMENT id it produced (or LAST_INSERT_ID(expr) set by the query)."""
+    connection = connection_pool.get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query, params)
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+        connection.close()
+
+# Rows per executemany() in execute_many
+DB_BULK_CHUNK = int(os.getenv("DB_BULK_CHUNK", "500"))
+
+# Errors caused by the row itself; anything else (lost connection, bad SQL, missing table, ...) aborts the batch
+ROW_ERRORS = (mysql.connector.DataError, mysql.connector.IntegrityError)
+
+def execute_many(query, rows, chunk_size=DB_BULK_CHUNK, progress=None):
+    """
+    Run a write query once per params tuple in rows, in one transaction and
+    chunk_size rows per executemany() (multi-row VALUES for INSERTs).
+
+    A chunk the server rejects is retried row by row, so one bad row does not
+    sink its neighbours. Returns {"written": n, "failed": [{"index", "error"}]};
+    any other error rolls the whole batch back and is raised.
+    """
+    rows = list(rows)
+    result = {"written": 0, "failed": []}
+    if not rows:
+        return result
+
+    connection = connection_pool.get_connection()
+    cursor = connection.cursor()
+    try:
+        connection.start_transaction()
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                cursor.executemany(query, chunk)
+                result["written"] += len(chunk)
+            except ROW_ERRORS:
+                for index, params in enumerate(chunk, start=start):
+                    try:
+                        cursor.execute(query, params)
+                        result["written"] += 1
+                    except ROW_ERRORS as err:
+                        result["failed"].append({"index": index, "error": str(err)})
+            if progress:
+                progress(start + len(chunk), len(rows))
+        connection.commit()
+        return result
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
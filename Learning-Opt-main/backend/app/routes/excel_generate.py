@@ -1,9 +1,16 @@
 # backend/app/routes/excel_generate.py
+import json
 import os
 import re
+import shutil
 from flask import Blueprint, request, jsonify, send_file, current_app
 
-from app.services.excel_filler import ExcelTemplateFiller
+from app.services.excel_filler import CsvUpload, ExcelTemplateFiller
+from app.services.excel_stream import requested_engine
+from app.services.jobs import job_queue, spooled_copy, wants_async
+from app.services.output_cache import output_cache
+from app.services.roster_reader import is_csv
+from app.services.upload_ledger import content_hash
 
 # Optional: Import shared history tracker
 try:
@@ -17,6 +24,7 @@ DEFAULT_TEMPLATE_PATH = os.path.normpath(
     os.path.join(os.path.dirname(__file__), "..", "static", "excel", "template.xlsx")
 )
 DEFAULT_MAPPING = {}
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
 @excel_bp.route("/delete_excel", methods=["DELETE"])
 def delete_excel_file():
@@ -60,46 +68,125 @@ def generate_excel():
 
     f = request.files["file"]
     original_name = f.filename or "uploaded"
-    if not original_name.lower().endswith((".xlsx", ".xlsm")):
-        return err("Please upload an .xlsx or .xlsm file")
+    # CSV: details in 'file', grades in a second .csv file 'grades'
+    grades = None
+    if is_csv(original_name):
+        grades = request.files.get("grades")
+        if grades is None or not is_csv(grades.filename):
+            return err("CSV uploads need the grades as a second .csv file 'grades'")
+    elif not original_name.lower().endswith((".xlsx", ".xlsm")):
+        return err("Please upload an .xlsx, .xlsm or .csv file")
 
     mapping_json = request.form.get("mapping")
+    # name_match=normalized pairs details/grades rows ignoring case and extra whitespace
+    normalize_names = request.form.get("name_match", "").lower() == "normalized"
+    engine = requested_engine(request)
+    # split=1 returns a ZIP of workbooks filled in parallel (shards=N of them), split=trainee one per trainee
+    try:
+        split = _split_options(request.form)
+    except ValueError:
+        return err("shards and workers must be whole numbers")
 
     # Sanitize the filename (remove spaces and symbols)
     base_name = os.path.splitext(original_name)[0]
     safe_base_name = re.sub(r'[^a-zA-Z0-9_-]', '_', base_name)
     
-    out_name = f"{safe_base_name}_.xlsx"
+    out_name = f"{safe_base_name}_.zip" if split else f"{safe_base_name}_.xlsx"
+    mimetype = "application/zip" if split else XLSX_MIMETYPE
 
     # Load template and generate output
     template_path = getattr(current_app, "EXCEL_TEMPLATE_PATH", DEFAULT_TEMPLATE_PATH)
     print(f"[INFO] Using template: {template_path}  (exists={os.path.exists(template_path)})")
 
-    try:
-        filler = ExcelTemplateFiller(template_path, default_mapping=DEFAULT_MAPPING)
-        out_io, _ = filler.generate_from_filestorage(f, mapping_json)
-
-        # Save to /static/generated/
-        output_dir = os.path.join("static", "generated")
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, out_name)
-        with open(output_path, "wb") as out_file:
-            out_file.write(out_io.getbuffer())
-
-        # Track in download history
-        recent_downloads.insert(0, {
-            "type": "tesda",
-            "filename": out_name,
-            
-            "url": f"/static/generated/{out_name}"
-        })
+    # The uploads are hashed in blocks for the cache key and read from their streams, never held in memory
+    def upload(keep=lambda stream: stream):
+        if grades is not None:
+            return CsvUpload(keep(f.stream), keep(grades.stream))
+        return keep(f.stream)
+
+    cache_key = output_cache.key(template_path, "tesda", (mapping_json or "").encode("utf-8")
+                                  + b"\0" + content_hash(f.stream).encode()
+                                  + (b"\0grades\0" + content_hash(grades.stream).encode() if grades is not None else b"")
+                                  + (b"\0normalized" if normalize_names else b"")
+                                  + (b"\0" + engine.encode() if engine != "openpyxl" else b"")
+                                  + (b"\0split=" + json.dumps(split, sort_keys=True).encode() if split else b""))
+    cached = output_cache.get(cache_key)
+    if cached:
+        return send_file(
+            cached["path"],
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=out_name,
+        )
+
+    if wants_async(request):
+        job_id = job_queue.submit(
+            "tesda_excel", _tesda_job, template_path, upload(spooled_copy), mapping_json, out_name, cache_key,
+            normalize_names, engine, split
+        )
+        return jsonify({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
 
+    try:
+        output_path = _fill_tesda_template(
+            template_path, upload(), mapping_json, out_name, normalize_names=normalize_names, engine=engine,
+            split=split
+        )
+        output_cache.put(cache_key, out_name, source_path=output_path)
     except Exception as e:
         return err(str(e), status=500)
 
     return send_file(
         output_path,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        mimetype=mimetype,
         as_attachment=True,
         download_name=out_name,
-    )
\ No newline at end of file
+    )
+
+def _split_options(form):
+    """{"per_trainee", "shards", "workers"} for a split (ZIP) output, or None for the single workbook."""
+    split = (form.get("split") or "").lower()
+    if split in ("", "0", "false", "no"):
+        return None
+    return {
+        "per_trainee": split == "trainee",
+        "shards": int(form.get("shards") or 0) or None,
+        "workers": int(form.get("workers") or 0) or None,
+    }
+
+def _fill_tesda_template(template_path, file_storage, mapping_json, out_name, progress=None, normalize_names=False,
+                         engine="openpyxl", split=None):
+    filler = ExcelTemplateFiller(template_path, default_mapping=DEFAULT_MAPPING)
+    if split:
+        out_io, _ = filler.generate_zip_from_filestorage(file_storage, mapping_json, progress=progress,
+                                                         normalize_names=normalize_names, engine=engine, **split)
+    else:
+        out_io, _ = filler.generate_from_filestorage(file_storage, mapping_json, progress=progress,
+                                                     normalize_names=normalize_names, engine=engine)
+
+    # Save to /static/generated/
+    output_dir = os.path.join("static", "generated")
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, out_name)
+    with out_io, open(output_path, "wb") as out_file:
+        shutil.copyfileobj(out_io, out_file)
+
+    # Track in download history
+    recent_downloads.insert(0, {
+        "type": "tesda",
+        "filename": out_name,
+        "url": f"/static/generated/{out_name}"
+    })
+    return output_path
+
+
+def _tesda_job(progress, template_path, upload, mapping_json, out_name, cache_key, normalize_names=False,
+               engine="openpyxl", split=None):
+    output_path = _fill_tesda_template(template_path, upload, mapping_json, out_name, progress, normalize_names, engine,
+                                       split)
+    output_cache.put(cache_key, out_name, source_path=output_path)
+    return {
+        "path": os.path.abspath(output_path),
+        "download_name": out_name,
+        "mimetype": "application/zip" if split else XLSX_MIMETYPE,
+        "files": [out_name],
+    }
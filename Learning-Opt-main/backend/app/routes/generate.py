@@ -1,17 +1,27 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file
 from flask_cors import cross_origin
-from pptx import Presentation
-from openpyxl import load_workbook
+import html
 import os
+import shutil
 import tempfile
 import json
 import io
 import re
-from copy import deepcopy
 from datetime import datetime
 import logging
 from openpyxl.utils import get_column_letter
 
+from app.services.certificate_decks import (
+    build_deck, iter_certificate_zip, merge_decks, render_parallel,
+)
+from app.services.excel_stream import StreamingTemplateWriter, requested_engine, template_book
+from app.services.jobs import job_queue, wants_async
+from app.services.output_cache import output_cache
+from app.services.pptx_fastpath import FastPathUnsupported, get_xml_template
+from app.services.placeholders import substitute
+from app.services.pptx_templates import template_cache
+from app.services.workbook_templates import workbook_templates
+
 bp = Blueprint('generate', __name__, url_prefix='/generate')
 
 # Base paths
@@ -20,6 +30,18 @@ TEMPLATE_DIR = os.path.join(BASE_DIR, 'uploads', 'templates')
 OUTPUT_DIR = os.path.join(BASE_DIR, 'static', 'generated')
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Write static/generated/debug_generated.xlsx on /generate/excel (also per request with ?debug=1)
+EXCEL_DEBUG_COPY = os.getenv("EXCEL_DEBUG_COPY", "0").lower() in ("1", "true", "yes")
+
+# Default certificate engine: "pptx" (python-pptx object model) or "xml" (direct-XML fast path)
+CERT_ENGINE = os.getenv("CERT_ENGINE", "pptx")
+
+def wants_debug_copy(req):
+    flag = req.args.get("debug")
+    if flag is None and req.is_json:
+        flag = (req.get_json(silent=True) or {}).get("debug")
+    return EXCEL_DEBUG_COPY or str(flag).lower() in ("1", "true", "yes")
+
 def to_number(val):
     """Convert to int/float if numeric, else return original or None."""
     try:
@@ -39,6 +61,125 @@ def safe_write(ws, row, col_idx, value):
     ws.cell(row=row, column=col_idx).value = value
 
 
+REPORT_SHEETS = ["PRODUCTION", "SUPPORT", "TECHNICAL"]
+
+# Extra grade columns per department sheet: column index -> student key
+REPORT_EXTRAS = {
+    "PRODUCTION": {
+        22: "13G",  # V
+        23: "14G",  # W
+        24: "15G",  # X
+        25: "16G",  # Y
+        28: "17G",  # AB
+        29: "18G",  # AC
+    },
+    "SUPPORT": {
+        21: "13G",  # U
+        26: "14G",  # Z
+        29: "15G",  # AC
+    },
+    "TECHNICAL": {
+        20: "13G",  # T
+        27: "14G",  # AA
+        29: "15G",  # AC
+    },
+}
+
+
+def iter_immersion_report(students, sheet_names, progress=None):
+    """Yield (sheet, row, {column: value}) for the immersion report; rows ascend within each sheet."""
+    first_student = students[0]
+    immersion_date = first_student.get("date_of_immersion", "")
+    batch = first_student.get("batch", "")
+    school = first_student.get("school", "")
+
+    for dept in sheet_names:
+        yield dept, 8, {8: f"{batch} - {school}"}  # H8
+        yield dept, 9, {8: immersion_date}          # H9
+
+    row_counter = {dept: 10 for dept in sheet_names}
+
+    for done, s in enumerate(students, start=1):
+        if progress:
+            progress(done, len(students))
+        dept_raw = (s.get("department") or "").strip().upper()
+        if dept_raw in ["TECHNICAL", "IT"]:
+            dept = "TECHNICAL"
+        elif dept_raw == "PROD":
+            dept = "PRODUCTION"
+        else:
+            dept = "SUPPORT"
+
+        if dept not in row_counter:
+            logging.warning(f"Department {dept} not in sheet_map, skipping student: {s}")
+            continue
+
+        # Student info columns B-F (2-6)
+        values = {
+            2: s.get("last_name", ""),
+            3: s.get("first_name", ""),
+            4: s.get("middle_name", ""),
+            5: s.get("strand", ""),
+            6: s.get("department", ""),
+        }
+
+        # Grades columns G-R (7-18) = 1G to 12G
+        for i, col_idx in enumerate(range(7, 19), start=1):
+            values[col_idx] = to_number(s.get(f"{i}G", ""))
+
+        for col_idx, key in REPORT_EXTRAS.get(dept, {}).items():
+            values[col_idx] = to_number(s.get(key, ""))
+
+        yield dept, row_counter[dept], values
+        row_counter[dept] += 1
+
+
+def unmerge_report_sheets(wb):
+    """Unmerge every range on the department sheets so row writes never hit a MergedCell."""
+    for dept in REPORT_SHEETS:
+        if dept in wb.sheetnames:
+            ws = wb[dept]
+            for merged_range in list(ws.merged_cells.ranges):
+                ws.unmerge_cells(str(merged_range))
+
+def build_immersion_report(students, progress=None):
+    """Fill grades2.xlsx with one row per student on its department sheet."""
+    template_path = os.path.join(TEMPLATE_DIR, 'grades2.xlsx')
+    if not os.path.exists(template_path):
+        raise FileNotFoundError("Grades.xlsx template not found")
+
+    wb = workbook_templates.checkout(template_path, prepare=unmerge_report_sheets)
+    sheet_map = {}
+    for dept in REPORT_SHEETS:
+        if dept in wb.sheetnames:
+            sheet_map[dept] = wb[dept]
+
+    for dept, row, values in iter_immersion_report(students, list(sheet_map), progress):
+        ws = sheet_map[dept]
+        for col_idx, val in values.items():
+            safe_write(ws, row, col_idx, val)
+            logging.debug(f"Wrote {val} to {get_column_letter(col_idx)}{row}")
+
+    return wb
+
+
+def stream_immersion_report(students, fileobj, progress=None):
+    """Constant-memory variant of build_immersion_report that writes the workbook straight to fileobj."""
+    template_path = os.path.join(TEMPLATE_DIR, 'grades2.xlsx')
+    if not os.path.exists(template_path):
+        raise FileNotFoundError("Grades.xlsx template not found")
+
+    writer = StreamingTemplateWriter(template_book(template_path), full_calc_on_load=False)
+    sheets = {}
+    for title in writer.book.sheet_names:
+        # Same output as build_immersion_report, which unmerges the department sheets
+        sheets[title] = writer.sheet(title, unmerge=title in REPORT_SHEETS)
+
+    depts = [d for d in REPORT_SHEETS if d in sheets]
+    for dept, row, values in iter_immersion_report(students, depts, progress):
+        sheets[dept].write_row(row, values)
+    writer.save(fileobj)
+
 @bp.route('/excel', methods=['POST'])
 def generate_excel():
     try:
@@ -50,103 +191,45 @@ def generate_excel():
         if not os.path.exists(template_path):
             return jsonify({"error": "Grades.xlsx template not found"}), 500
 
-        wb = load_workbook(template_path)
-        sheet_map = {}
-        for dept in ["PRODUCTION", "SUPPORT", "TECHNICAL"]:
-            if dept in wb.sheetnames:
-                sheet_map[dept] = wb[dept]
-
-        # --- Unmerge all merged cells from row 10 onwards to avoid merged cell write errors ---
-        for ws in sheet_map.values():
-            merged_ranges = list(ws.merged_cells.ranges)
-            for merged_range in merged_ranges:
-                ws.unmerge_cells(str(merged_range))
-
-        first_student = students[0]
-        immersion_date = first_student.get("date_of_immersion", "")
-        batch = first_student.get("batch", "")
-        school = first_student.get("school", "")
-    
-        for dept, ws in sheet_map.items():
-            safe_write(ws, 8, 8, f"{batch} - {school}")  # H8
-            safe_write(ws, 9, 8, immersion_date)          # H9
-
-        row_counter = {dept: 10 for dept in sheet_map.keys()}
-
-        for s in students:
-            dept_raw = (s.get("department") or "").strip().upper()
-            if dept_raw in ["TECHNICAL", "IT"]:
-                dept = "TECHNICAL"
-            elif dept_raw == "PROD":
-                dept = "PRODUCTION"
-            else:
-                dept = "SUPPORT"
-
-            if dept not in sheet_map:
-                logging.warning(f"Department {dept} not in sheet_map, skipping student: {s}")
-                continue
-
-            ws = sheet_map[dept]
-            row = row_counter[dept]
-
-            # Write student info columns B-F (2-6)
-            safe_write(ws, row, 2, s.get("last_name", ""))
-            safe_write(ws, row, 3, s.get("first_name", ""))
-            safe_write(ws, row, 4, s.get("middle_name", ""))
-            safe_write(ws, row, 5, s.get("strand", ""))
-            safe_write(ws, row, 6, s.get("department", ""))
-
-            # Grades columns G-R (7-18) = 1G to 12G
-            for i, col_idx in enumerate(range(7, 19), start=1):
-                val = to_number(s.get(f"{i}G", ""))
-                safe_write(ws, row, col_idx, val)
-                logging.debug(f"Wrote {val} to {get_column_letter(col_idx)}{row}")
-
-            # Extra columns per department
-            if dept == "PRODUCTION":
-                extras = {
-                    22: "13G",  # V
-                    23: "14G",  # W
-                    24: "15G",  # X
-                    25: "16G",  # Y
-                    28: "17G",  # AB
-                    29: "18G",  # AC
-                }
-            elif dept == "SUPPORT":
-                extras = {
-                    21: "13G",  # U
-                    26: "14G",  # Z
-                    29: "15G",  # AC
-                }
-            elif dept == "TECHNICAL":
-                extras = {
-                    20: "13G",  # T
-                    27: "14G",  # AA
-                    29: "15G",  # AC
-                }
-            else:
-                extras = {}
-
-            for col_idx, key in extras.items():
-                val = to_number(s.get(key, ""))
-                safe_write(ws, row, col_idx, val)
-                logging.debug(f"Wrote {val} to {get_column_letter(col_idx)}{row}")
-
-            row_counter[dept] += 1
-
-        # Save locally for manual checking
-        debug_path = os.path.join(OUTPUT_DIR, "debug_generated.xlsx")
-        wb.save(debug_path)
-        logging.info(f"Saved debug Excel file to: {debug_path}")
-
-        # Save temp file for sending
-        temp_dir = tempfile.mkdtemp()
         output_filename = "generated_immersion_report.xlsx"
-        output_path = os.path.join(temp_dir, output_filename)
-        wb.save(output_path)
-
+        engine = requested_engine(request)
+        cache_type = "immersion_report" if engine == "openpyxl" else f"immersion_report:{engine}"
+        cache_key = output_cache.key(template_path, cache_type, students)
+        cached = output_cache.get(cache_key)
+        if cached:
+            return send_file(cached["path"], as_attachment=True, download_name=output_filename)
+
+        if wants_async(request):
+            job_id = job_queue.submit(
+                "immersion_report", _immersion_report_job, students, cache_key, engine, total=len(students)
+            )
+            return jsonify({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+
+        if engine == "stream":
+            # Rows go straight to a spooled file; it is served from the cache entry
+            with tempfile.TemporaryFile() as spool:
+                stream_immersion_report(students, spool)
+                spool.seek(0)
+                cached = output_cache.put(cache_key, output_filename, fileobj=spool)
+            return send_file(cached["path"], as_attachment=True, download_name=output_filename)
+
+        wb = build_immersion_report(students)
+
+        # Serialize once; the cache entry, the optional debug copy and the response share the bytes
+        output = io.BytesIO()
+        wb.save(output)
+        output_cache.put(cache_key, output_filename, data=output.getvalue())
+
+        if wants_debug_copy(request):
+            debug_path = os.path.join(OUTPUT_DIR, "debug_generated.xlsx")
+            with open(debug_path, "wb") as f:
+                f.write(output.getbuffer())
+            logging.info(f"Saved debug Excel file to: {debug_path}")
+
+        output.seek(0)
         return send_file(
-            output_path,
+            output,
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             as_attachment=True,
             download_name=output_filename
         )
@@ -155,22 +238,19 @@ def generate_excel():
         logging.error(f"Error generating Excel: {e}")
         return jsonify({"error": str(e)}), 500
 
-# --------- Certificate generation and preview routes ---------
+def _immersion_report_job(progress, students, cache_key, engine="openpyxl"):
+    output_filename = f"generated_immersion_report ({datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}).xlsx"
+    output_path = os.path.join(OUTPUT_DIR, output_filename)
+    if engine == "stream":
+        with open(output_path, "wb") as f:
+            stream_immersion_report(students, f, progress)
+    else:
+        wb = build_immersion_report(students, progress)
+        wb.save(output_path)
+    output_cache.put(cache_key, output_filename, source_path=output_path)
+    return {"path": output_path, "download_name": output_filename, "files": [output_filename]}
 
-def fill_slide(slide, data_row):
-    for shape in slide.shapes:
-        if not shape.has_text_frame:
-            continue
-        for paragraph in shape.text_frame.paragraphs:
-            full_text = ''.join(run.text for run in paragraph.runs)
-            replaced = full_text
-            for key, value in data_row.items():
-                ph = f"{{{key}}}"
-                replaced = replaced.replace(ph, str(value))
-            if replaced != full_text:
-                for run in paragraph.runs:
-                    run.text = ""
-                paragraph.runs[0].text = replaced
+# --------- Certificate generation and preview routes ---------
 
 @bp.route('/delete_certificate', methods=['DELETE'])
 @cross_origin()
@@ -204,25 +284,112 @@ def generate_certificates():
     if not os.path.exists(template_path):
         return jsonify({"error": f"Template '{tpl_filename}' not found"}), 404
 
-    prs = Presentation(template_path)
-    source_slide = prs.slides[0]
-    original_elements = [deepcopy(shape.element) for shape in source_slide.shapes]
-    fill_slide(source_slide, rows[0])
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
 
-    for row in rows[1:]:
-        new_slide = prs.slides.add_slide(source_slide.slide_layout)
-        for shp in list(new_slide.shapes):
-            new_slide.shapes._spTree.remove(shp.element)
-        for el in original_elements:
-            new_slide.shapes._spTree.append(deepcopy(el))
-        fill_slide(new_slide, row)
+    if data.get('parallel') or data.get('split'):
+        try:
+            _parallel_options(data)
+        except (TypeError, ValueError):
+            return jsonify({"error": "workers and chunk_size must be non-negative whole numbers"}), 400
+
+    # One certificate per row, streamed as a ZIP while it is being rendered
+    if data.get('output') == 'zip':
+        zip_name = f"certificate_{template_type} ({timestamp}).zip"
+        return Response(
+            iter_certificate_zip(template_path, rows),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{zip_name}"'},
+        )
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+    # A repeat of an earlier single-deck request reuses the deck it produced
+    cache_key = None
+    if not data.get('split') and data.get('cache', True):
+        # The engine and parallel merge write different packages, so they are cached apart
+        cache_type = template_type
+        if data.get('engine', CERT_ENGINE) != 'pptx':
+            cache_type += f":{data.get('engine', CERT_ENGINE)}"
+        if data.get('parallel'):
+            cache_type += ":parallel"
+        cache_key = output_cache.key(template_path, cache_type, rows)
+        cached = output_cache.get(cache_key)
+        if cached:
+            cached_name = cached["filename"]
+            cached_path = os.path.join(OUTPUT_DIR, cached_name)
+            if not os.path.exists(cached_path):
+                shutil.copyfile(cached["path"], cached_path)
+            return jsonify({"message": "Certificates generated", "files": [cached_name], "cached": True})
+
+    if wants_async(request):
+        job_id = job_queue.submit(
+            "certificates", _certificate_job, data, template_type, template_path, rows, timestamp, cache_key,
+            total=len(rows)
+        )
+        return jsonify({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+
+    files = render_certificate_files(data, template_type, template_path, rows, timestamp)
+    if cache_key:
+        output_cache.put(cache_key, files[0], source_path=os.path.join(OUTPUT_DIR, files[0]))
+    return jsonify({"message": "Certificates generated", "files": files})
+
+def _parallel_options(data):
+    """(workers, chunk_size) for parallel rendering; None means the default. ValueError on bad input."""
+    options = []
+    for field in ('workers', 'chunk_size'):
+        value = int(data.get(field) or 0)
+        if value < 0:
+            raise ValueError(field)
+        options.append(value or None)
+    return tuple(options)
+
+def render_certificate_files(data, template_type, template_path, rows, timestamp, progress=None):
+    """Render the deck(s) for /generate/certificates into OUTPUT_DIR and return their names."""
     output_name = f"certificate_{template_type} ({timestamp}).pptx"
     output_path = os.path.join(OUTPUT_DIR, output_name)
+
+    # Optional process-pool rendering: one partial deck per chunk of rows
+    if data.get('parallel') or data.get('split'):
+        workers, chunk_size = _parallel_options(data)
+        blobs = render_parallel(template_path, rows, workers=workers, chunk_size=chunk_size, progress=progress)
+
+        if data.get('split'):
+            files = []
+            for part, blob in enumerate(blobs, start=1):
+                part_name = f"certificate_{template_type} ({timestamp}) part {part}.pptx"
+                with open(os.path.join(OUTPUT_DIR, part_name), "wb") as f:
+                    f.write(blob)
+                files.append(part_name)
+            return files
+
+        # The partial decks' slides are joined at the package level, without rebuilding them
+        with open(output_path, "wb") as f:
+            merge_decks(blobs, f)
+        return [output_name]
+
+    template = template_cache.get(template_path)
+
+    # Direct-XML writer for simple text-only templates; falls back to python-pptx
+    if data.get('engine', CERT_ENGINE) == 'xml':
+        try:
+            xml_template = get_xml_template(template)
+            with open(output_path, "wb") as f:
+                xml_template.write_deck(rows, f, progress=progress)
+            return [output_name]
+        except FastPathUnsupported as e:
+            logging.info(f"XML fast path unavailable for {os.path.basename(template_path)}: {e}")
+
+    # Serial python-pptx rendering
+    prs = build_deck(template, rows, progress=progress)
     prs.save(output_path)
+    return [output_name]
 
-    return jsonify({"message": "Certificates generated", "files": [output_name]})
+def _certificate_job(progress, data, template_type, template_path, rows, timestamp, cache_key=None):
+    files = render_certificate_files(data, template_type, template_path, rows, timestamp, progress)
+    if cache_key:
+        output_cache.put(cache_key, files[0], source_path=os.path.join(OUTPUT_DIR, files[0]))
+    result = {"message": "Certificates generated", "files": files}
+    if len(files) == 1:
+        result.update(path=os.path.join(OUTPUT_DIR, files[0]), download_name=files[0])
+    return result
 
 @bp.route('/files/<filename>', methods=['GET'])
 @cross_origin()
@@ -253,37 +420,54 @@ def preview_certificate():
         # (I can help add this if you want, but omitted here for brevity)
         pass
 
-    # Default preview (non-TESDA)
-    html_parts = [
-        "<!DOCTYPE html><html><head><meta charset='utf-8'>",
-        "<meta name='viewport' content='width=device-width, initial-scale=1.0'>",
-        "<title>Certificate Preview</title><style>",
-        "body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background: #2d3748; margin: 0; padding: 20px; min-height: 100vh; }",
-        ".container { max-width: 900px; margin: 0 auto; }",
-        "h2 { text-align: center; color: white; font-size: 2.5rem; margin-bottom: 30px; }",
-        ".slide-preview { background: #4a5568; border-radius: 12px; padding: 25px; margin-bottom: 25px; box-shadow: 0 8px 32px rgba(0,0,0,0.2); border: 1px solid #718096; transition: transform 0.2s ease; }",
-        ".slide-preview:hover { transform: translateY(-2px); box-shadow: 0 12px 40px rgba(0,0,0,0.3); }",
-        ".slide-preview h4 { color: white; font-size: 1.3rem; margin: 0 0 15px 0; padding-bottom: 8px; border-bottom: 2px solid #718096; }",
-        ".slide-preview p { margin: 10px 0; font-size: 1.1rem; line-height: 1.6; color: #e2e8f0; padding: 8px 12px; background: #2d3748; border-radius: 6px; border-left: 4px solid #a361ef; }",
-        ".certificate-text { font-weight: 500; }",
-        "@media (max-width: 768px) { .container { padding: 10px; } .slide-preview { padding: 20px; } h2 { font-size: 2rem; } }",
-        "</style></head><body><div class='container'><h2>Certificate Preview</h2>"
-    ]
-
-    for idx, row in enumerate(rows):
-        prs_row = Presentation(template_path)
-        slide = prs_row.slides[0]
-        fill_slide(slide, row)
-        html_parts.append("<div class='slide-preview certificate-text'>")
-        html_parts.append(f"<h4>Certificate {idx+1}</h4>")
-
-        for shape in slide.shapes:
-            if not shape.has_text_frame:
-                continue
-            for paragraph in shape.text_frame.paragraphs:
-                text = ''.join(run.text for run in paragraph.runs)
-                if text.strip():
-                    html_parts.append(f"<p>{text}</p>")
-        html_parts.append("</div>")
-    html_parts.append("</div></body></html>")
-    return "\n".join(html_parts), 200, {"Content-Type": "text/html"}
+    # Only the requested page is rendered; omitting limit keeps the old "all rows" behaviour
+    args = {**request.args.to_dict(), **data}
+    try:
+        offset = max(int(args.get('offset') or 0), 0)
+        limit = int(args['limit']) if args.get('limit') not in (None, "") else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "offset and limit must be whole numbers"}), 400
+    if limit is not None and limit < 0:
+        return jsonify({"error": "limit must not be negative"}), 400
+    page = rows[offset:offset + limit if limit is not None else None]
+
+    template = template_cache.get(template_path)
+    return Response(
+        _iter_preview_html(template, page, offset),
+        mimetype="text/html",
+        headers={"X-Total-Rows": str(len(rows)), "X-Offset": str(offset), "X-Returned-Rows": str(len(page))},
+    )
+
+PREVIEW_HEAD = "\n".join([
+    "<!DOCTYPE html><html><head><meta charset='utf-8'>",
+    "<meta name='viewport' content='width=device-width, initial-scale=1.0'>",
+    "<title>Certificate Preview</title><style>",
+    "body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background: #2d3748; margin: 0; padding: 20px; min-height: 100vh; }",
+    ".container { max-width: 900px; margin: 0 auto; }",
+    "h2 { text-align: center; color: white; font-size: 2.5rem; margin-bottom: 30px; }",
+    ".slide-preview { background: #4a5568; border-radius: 12px; padding: 25px; margin-bottom: 25px; box-shadow: 0 8px 32px rgba(0,0,0,0.2); border: 1px solid #718096; transition: transform 0.2s ease; }",
+    ".slide-preview:hover { transform: translateY(-2px); box-shadow: 0 12px 40px rgba(0,0,0,0.3); }",
+    ".slide-preview h4 { color: white; font-size: 1.3rem; margin: 0 0 15px 0; padding-bottom: 8px; border-bottom: 2px solid #718096; }",
+    ".slide-preview p { margin: 10px 0; font-size: 1.1rem; line-height: 1.6; color: #e2e8f0; padding: 8px 12px; background: #2d3748; border-radius: 6px; border-left: 4px solid #a361ef; }",
+    ".certificate-text { font-weight: 500; }",
+    "@media (max-width: 768px) { .container { padding: 10px; } .slide-preview { padding: 20px; } h2 { font-size: 2rem; } }",
+    "</style></head><body><div class='container'><h2>Certificate Preview</h2>"
+])
+
+def _iter_preview_html(template, rows, offset=0, rows_per_chunk=50):
+    """Yield the preview page in chunks; row text comes from the cached template's paragraph text."""
+    yield PREVIEW_HEAD + "\n"
+    buf = []
+    for idx, row in enumerate(rows, start=offset + 1):
+        buf.append("<div class='slide-preview certificate-text'>")
+        buf.append(f"<h4>Certificate {idx}</h4>")
+        for text in template.paragraph_texts:
+            text = substitute(text, row)
+            if text.strip():
+                buf.append(f"<p>{html.escape(text, quote=False)}</p>")
+        buf.append("</div>")
+        if (idx - offset) % rows_per_chunk == 0:
+            yield "\n".join(buf) + "\n"
+            buf = []
+    buf.append("</div></body></html>")
+    yield "\n".join(buf)
@@ -1,12 +1,19 @@
 import os
-from flask import Blueprint, request, jsonify
-from openpyxl import load_workbook
+from flask import Blueprint, Response, request, jsonify
+from werkzeug.http import is_resource_modified
 from openpyxl.utils import get_column_letter
 from copy import copy
 from io import BytesIO
-import json
 import traceback
-from app import config  # DB execution helper
+from app.services.grading import grader
+from app.services.immersion_batches import batch_registry
+from app.services.immersion_records import insert_records
+from app.services.ingestion import ingestion_pipeline
+from app.services.jobs import spooled_copy, wants_async
+from app.services.json_rows import json_rows
+from app.services.roster_reader import ROSTER_WIDTH, open_roster
+from app.services.upload_ledger import content_hash, upload_ledger, wants_force
+from app.services.workbook_templates import workbook_templates
 
 immersion_bp = Blueprint('immersion', __name__)
 
@@ -28,160 +35,181 @@ def fill_template():
         return jsonify({"error": "No selected file"}), 400
 
     try:
-       # Load uploaded Excel
-        file.stream.seek(0)
-        wb_uploaded = load_workbook(file.stream, data_only=True)
-        ws_uploaded = wb_uploaded.active
-
-        # ---------------------- Extract SCHOOL & BATCH ----------------------
-        school = str(ws_uploaded["F1"].value or "").strip()
-        batch = str(ws_uploaded["G1"].value or "").strip()
-
-
-        # ---------------------- Read all student rows (start row 10) ----------------------
-        data = []
-        for row in ws_uploaded.iter_rows(min_row=10, values_only=True):
-            if not any(row):
-                continue
-            data.append({
-                "LAST_NAME": row[0] or "",
-                "FIRST_NAME": row[1] or "",
-                "MIDDLE_NAME": row[2] or "",
-                "STRAND": row[3] or "",
-                "DEPARTMENT": row[4] or "",
-                "WI": float(row[5] or 0),
-                "CO": float(row[6] or 0),
-                "5S": float(row[7] or 0),
-                "BO": float(row[8] or 0),
-                "CBO": float(row[9] or 0),
-                "SDG": float(row[10] or 0),
-                "OHSA": float(row[11] or 0),
-                "WE": float(row[12] or 0),
-                "UJC": float(row[13] or 0),
-                "ISO": float(row[14] or 0),
-                "PO": float(row[15] or 0),
-                "HR": float(row[16] or 0),
-                "PERDEV": float(row[17] or 0),
-                "SUPP": float(row[18] or 0),
-                "DS": float(row[19] or 0)
-            })
-
-            # ✅ Attach school + batch to every entry
-        for entry in data:
-            entry["SCHOOL"] = school
-            entry["BATCH"] = batch
-
-        # ---------------------- Compute Totals & Grades ----------------------
-        written_fields = ["WI", "CO", "5S", "BO", "CBO", "SDG"]
-        performance_fields = ["OHSA", "WE", "UJC", "ISO", "PO", "HR", "PERDEV", "SUPP", "DS"]
-
-        for entry in data:
-            total_score = sum(entry[f] for f in written_fields + performance_fields)
-            entry["TOTAL_SCORE"] = total_score
-
-            entry["WRITTEN_RATING"] = round(sum(entry[f] for f in written_fields) / len(written_fields), 2)
-            entry["PERFORMANCE_RATING"] = round(sum(entry[f] for f in performance_fields) / len(performance_fields), 2)
-
-            # Assign FINAL_GRADE & REMARKS
-            if total_score >= 90:
-                entry["FINAL_GRADE"] = "A"
-            elif total_score >= 80:
-                entry["FINAL_GRADE"] = "B"
-            elif total_score >= 70:
-                entry["FINAL_GRADE"] = "C"
-            elif total_score >= 60:
-                entry["FINAL_GRADE"] = "D"
-            else:
-                entry["FINAL_GRADE"] = "F"
-
-            entry["REMARKS"] = "Passed" if entry["FINAL_GRADE"] != "F" else "Failed"
-
-        # ---------------------- Save to Database ----------------------
-        # First insert into immersion_batches
-        if school and batch:
-            row = config.fetch_one(
-                "SELECT id FROM immersion_batches WHERE school=%s AND batch=%s",
-                (school, batch)
-            )
-            if not row:
-                config.execute_query(
-                    "INSERT INTO immersion_batches (school, batch) VALUES (%s, %s)",
-                    (school, batch)
+        # Same file again (double submit, re-upload): answer from the ledger unless force=1
+        digest = content_hash(file.stream)
+        with upload_ledger.claim(digest, "fill-template"):
+            if not wants_force(request):
+                stored = upload_ledger.lookup(digest, "fill-template")
+                if stored is not None:
+                    save_upload_json(stored["rows"])
+                    return jsonify({**stored, "duplicate": True})
+
+            # async=1: parse, grade and store in the background pipeline, poll /api/ingestions/<id>
+            if wants_async(request):
+                ingestion = ingestion_pipeline.submit(
+                    "fill-template", spooled_copy(file.stream), immersion_row, key=str.upper,
+                    start=batch_registry.resolve, finish=_roster_result, digest=digest,
+                    filename=file.filename, keep_rows=True
                 )
+                return jsonify({"ingestion_id": ingestion.id, "status_url": f"/api/ingestions/{ingestion.id}"}), 202
 
-        for entry in data:
-            try:
-                config.execute_query("""
-                    INSERT INTO immersion_records (
-                        last_name, first_name, middle_name, strand, department,
-                        WI, CO, 5S, BO, CBO, SDG,
-                        OHSA, WE, UJC, ISO, PO, HR,
-                        PERDEV, SUPP, DS,
-                        total_score, written_rating, performance_rating, final_grade, remarks
-                    )
-                    VALUES (
-                        %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s,
-                        %s, %s, %s, %s, %s
-                    )
-                """, (
-                    entry["LAST_NAME"], entry["FIRST_NAME"], entry["MIDDLE_NAME"], entry["STRAND"], entry["DEPARTMENT"],
-                    int(entry["WI"]), int(entry["CO"]), int(entry["5S"]), int(entry["BO"]), int(entry["CBO"]), int(entry["SDG"]),
-                    int(entry["OHSA"]), int(entry["WE"]), int(entry["UJC"]), int(entry["ISO"]), int(entry["PO"]), int(entry["HR"]),
-                    int(entry["PERDEV"]), int(entry["SUPP"]), int(entry["DS"]),
-                    float(entry["TOTAL_SCORE"]), float(entry["WRITTEN_RATING"]), float(entry["PERFORMANCE_RATING"]),
-                    entry["FINAL_GRADE"], entry["REMARKS"]
-                ))
-            except Exception as e:
-                print(f"❌ DB insert failed for {entry['LAST_NAME']}, {entry['FIRST_NAME']}: {e}")
-
-        # ---------------------- Save JSON for frontend ----------------------
-        os.makedirs(os.path.dirname(UPLOAD_JSON_PATH), exist_ok=True)
-        with open(UPLOAD_JSON_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-
-        # ---------------------- Fill Excel Template ----------------------
-        if not os.path.exists(TEMPLATE_PATH):
-            return jsonify({"error": f"Template not found at {TEMPLATE_PATH}"}), 500
-
-        wb_template = load_workbook(TEMPLATE_PATH)
-        ws_template = wb_template.active
-        start_row = 10
-
-        # ✅ Insert school + batch into A8
-        ws_template["A8"] = f"{school} - {batch}"    
-
-        for idx, entry in enumerate(data):
-            row = start_row + idx
-            ws_template.cell(row=row, column=1, value=idx + 1)
-            ws_template.cell(row=row, column=2, value=entry["LAST_NAME"])
-            ws_template.cell(row=row, column=3, value=entry["FIRST_NAME"])
-            ws_template.cell(row=row, column=4, value=entry["MIDDLE_NAME"])
-            ws_template.cell(row=row, column=5, value=entry["STRAND"])
-            ws_template.cell(row=row, column=6, value=entry["DEPARTMENT"])
-
-        output = BytesIO()
-        wb_template.save(output)
-        output.seek(0)
-
-        return jsonify({
-            "message": "Data saved to DB and template filled successfully",
-            "school": school,
-            "batch": batch,
-            "rows": data
-        })
+            result = _process_roster(file.stream, file.filename)
+            upload_ledger.record(digest, "fill-template", result["school"], result["batch"],
+                                 len(result["rows"]), result)
+            return jsonify(result)
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 
+def save_upload_json(rows):
+    """Write the rows /immersion/data serves to the frontend (and drop its cached copy)."""
+    json_rows.write(UPLOAD_JSON_PATH, rows)
+
+
+def _process_roster(stream, filename=None):
+    """Parse, grade and store one roster and fill grades2.xlsx; returns the /fill-template response body."""
+    # Read-only parse of the uploaded Excel: F1/G1 up front, rows streamed
+    roster = open_roster(stream, filename, min_width=ROSTER_WIDTH)
+
+    # ---------------------- Extract SCHOOL & BATCH ----------------------
+    school, batch = roster.school, roster.batch
+
+
+    # ---------------------- Read all student rows (start row 10) ----------------------
+    data = [immersion_row(row, school, batch) for row in roster.rows() if any(row)]
+
+    # ---------------------- Compute Totals & Grades ----------------------
+    for entry, graded in zip(data, grader.grade(data, key=str.upper)):
+        entry.update(graded)
+
+    # ---------------------- Save to Database ----------------------
+    # First register the school/batch pair in immersion_batches
+    batch_registry.resolve(school, batch)
+
+    failed = insert_records(data, key=str.upper)
+
+    # ---------------------- Save JSON for frontend ----------------------
+    save_upload_json(data)
+
+    # ---------------------- Fill Excel Template ----------------------
+    fill_grades_template(school, batch, data)
+
+    return {
+        "message": "Data saved to DB and template filled successfully",
+        "school": school,
+        "batch": batch,
+        "rows": data,
+        "failed": failed
+    }
+
+
+def _roster_result(ingestion, data):
+    # data is the pipeline's disk spool: written out row by row, then the response rows are
+    # the snapshot /immersion/data serves, so the roster is held in memory once
+    save_upload_json(data)
+    fill_grades_template(ingestion.school, ingestion.batch, data)
+    return {
+        "message": "Data saved to DB and template filled successfully",
+        "school": ingestion.school,
+        "batch": ingestion.batch,
+        "rows": json_rows.load(UPLOAD_JSON_PATH).rows,
+        "failed": list(ingestion.failed)
+    }
+
+
+def immersion_row(row, school, batch):
+    """A roster row (columns A-T) as the entry /fill-template grades, stores and returns."""
+    return {
+        "LAST_NAME": row[0] or "",
+        "FIRST_NAME": row[1] or "",
+        "MIDDLE_NAME": row[2] or "",
+        "STRAND": row[3] or "",
+        "DEPARTMENT": row[4] or "",
+        "WI": float(row[5] or 0),
+        "CO": float(row[6] or 0),
+        "5S": float(row[7] or 0),
+        "BO": float(row[8] or 0),
+        "CBO": float(row[9] or 0),
+        "SDG": float(row[10] or 0),
+        "OHSA": float(row[11] or 0),
+        "WE": float(row[12] or 0),
+        "UJC": float(row[13] or 0),
+        "ISO": float(row[14] or 0),
+        "PO": float(row[15] or 0),
+        "HR": float(row[16] or 0),
+        "PERDEV": float(row[17] or 0),
+        "SUPP": float(row[18] or 0),
+        "DS": float(row[19] or 0),
+        # ✅ Attach school + batch to every entry
+        "SCHOOL": school,
+        "BATCH": batch
+    }
+
+
+def fill_grades_template(school, batch, data):
+    """grades2.xlsx with the school/batch in A8 and one numbered row per student from row 10."""
+    if not os.path.exists(TEMPLATE_PATH):
+        raise FileNotFoundError(f"Template not found at {TEMPLATE_PATH}")
+
+    wb_template = workbook_templates.checkout(TEMPLATE_PATH)
+    ws_template = wb_template.active
+    start_row = 10
+
+    # ✅ Insert school + batch into A8
+    ws_template["A8"] = f"{school} - {batch}"    
+
+    for idx, entry in enumerate(data):
+        row = start_row + idx
+        ws_template.cell(row=row, column=1, value=idx + 1)
+        ws_template.cell(row=row, column=2, value=entry["LAST_NAME"])
+        ws_template.cell(row=row, column=3, value=entry["FIRST_NAME"])
+        ws_template.cell(row=row, column=4, value=entry["MIDDLE_NAME"])
+        ws_template.cell(row=row, column=5, value=entry["STRAND"])
+        ws_template.cell(row=row, column=6, value=entry["DEPARTMENT"])
+
+    output = BytesIO()
+    wb_template.save(output)
+    output.seek(0)
+    return output
+
+
 @immersion_bp.route("/data", methods=["GET"])
 def get_immersion_data():
-    if not os.path.exists(UPLOAD_JSON_PATH):
+    snapshot = json_rows.load(UPLOAD_JSON_PATH)
+    if snapshot is None:
         return jsonify({"rows": []})
-    with open(UPLOAD_JSON_PATH, "r", encoding="utf-8") as f:
-        rows = json.load(f)
-    return jsonify({"rows": rows})
\ No newline at end of file
+
+    # Omitting limit keeps the old "all rows" response; fields=A,B keeps only those keys of each row
+    try:
+        offset = max(int(request.args.get("offset") or 0), 0)
+        limit = int(request.args["limit"]) if request.args.get("limit") not in (None, "") else None
+    except ValueError:
+        return jsonify({"error": "offset and limit must be whole numbers"}), 400
+    if limit is not None and limit < 0:
+        return jsonify({"error": "limit must not be negative"}), 400
+    fields = tuple(f.strip() for f in request.args.get("fields", "").split(",") if f.strip()) or None
+    variant = (offset, limit, fields)
+    etag = snapshot.variant_etag(variant)
+
+    # Pollers revalidate with If-None-Match / If-Modified-Since and get a 304 until the file changes;
+    # each page/projection has its own ETag, since their bodies differ
+    if not is_resource_modified(request.environ, etag=etag, last_modified=snapshot.last_modified):
+        response = Response(status=304)
+    else:
+        page = snapshot.rows[offset:offset + limit if limit is not None else None]
+
+        def build():
+            if fields is None:
+                return {"rows": page}
+            return {"rows": [{f: row[f] for f in fields if f in row} for row in page]}
+
+        response = Response(snapshot.body(variant, build), mimetype="application/json")
+        response.headers.update({"X-Total-Rows": str(len(snapshot.rows)), "X-Offset": str(offset),
+                                 "X-Returned-Rows": str(len(page))})
+
+    response.set_etag(etag)
+    response.last_modified = snapshot.last_modified
+    response.headers["Cache-Control"] = "no-cache"
+    return response
\ No newline at end of file
@@ -0,0 +1,14 @@
+# backend/app/routes/ingestions.py
+from flask import Blueprint, jsonify
+
+from app.services.ingestion import ingestion_pipeline
+
+ingestions_bp = Blueprint("ingestions", __name__, url_prefix="/api/ingestions")
+
+
+@ingestions_bp.route("/<ingestion_id>", methods=["GET"])
+def get_ingestion(ingestion_id):
+    ingestion = ingestion_pipeline.get(ingestion_id)
+    if ingestion is None:
+        return jsonify({"error": "Ingestion not found"}), 404
+    return jsonify(ingestion.snapshot())
@@ -0,0 +1,58 @@
+# backend/app/routes/jobs.py
+import os
+from flask import Blueprint, jsonify, send_file
+
+from app.services.jobs import job_queue
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api/jobs")
+
+
+def _public(job):
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "done": job["done"],
+        "total": job["total"],
+        "cancel_requested": bool(job["cancel_requested"]),
+        "result": job["result"],
+        "error": job["error"],
+        "download_url": f"/api/jobs/{job['id']}/download" if job["result_path"] else None,
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+@jobs_bp.route("/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(_public(job))
+
+
+@jobs_bp.route("/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not job_queue.cancel(job_id):
+        return jsonify({"error": f"Job already {job['status']}"}), 409
+    return jsonify(_public(job_queue.store.get(job_id)))
+
+
+@jobs_bp.route("/<job_id>/download", methods=["GET"])
+def download_job_result(job_id):
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"Job is {job['status']}"}), 409
+    if not job["result_path"] or not os.path.exists(job["result_path"]):
+        return jsonify({"error": "Result file not found"}), 404
+    return send_file(
+        job["result_path"],
+        mimetype=job["mimetype"],
+        as_attachment=True,
+        download_name=job["download_name"],
+    )
@@ -0,0 +1,296 @@
+# backend/app/services/certificate_decks.py
+import io, math, os, posixpath, re, zipfile
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from typing import IO, Any, Dict, List
+
+from lxml import etree
+
+from app.services.placeholders import fill_paragraph
+from app.services.pptx_templates import APP_PROPERTIES, CompiledTemplate, template_cache, with_slide_count
+
+DEFAULT_WORKERS = int(os.getenv("CERT_WORKERS", "0")) or (os.cpu_count() or 1)
+
+
+def _placeholder_paragraphs(slide, placeholders):
+    """Yield the paragraphs at the cached placeholder locations, or every paragraph."""
+    shapes = list(slide.shapes)
+    if placeholders is None:
+        for shape in shapes:
+            if shape.has_text_frame:
+                yield from shape.text_frame.paragraphs
+        return
+    for shape_idx, para_idx, _ in placeholders:
+        yield shapes[shape_idx].text_frame.paragraphs[para_idx]
+
+
+def fill_slide(slide, data_row, placeholders=None):
+    for paragraph in _placeholder_paragraphs(slide, placeholders):
+        fill_paragraph(paragraph, data_row)
+
+
+def _append_slide(prs, layout, elements):
+    new_slide = prs.slides.add_slide(layout)
+    for shp in list(new_slide.shapes):
+        new_slide.shapes._spTree.remove(shp.element)
+    for el in elements:
+        new_slide.shapes._spTree.append(deepcopy(el))
+    return new_slide
+
+
+def build_deck(template: CompiledTemplate, rows: List[Dict[str, Any]], progress=None):
+    """Fill the template's first slide with rows[0] and append one copy per remaining row."""
+    prs = template.open()
+    source_slide = prs.slides[0]
+    fill_slide(source_slide, rows[0], template.placeholders)
+
+    for done, row in enumerate(rows[1:], start=2):
+        new_slide = _append_slide(prs, source_slide.slide_layout, template.elements)
+        fill_slide(new_slide, row, template.placeholders)
+        if progress:
+            progress(done, len(rows))
+    return prs
+
+
+def _deck_bytes(template: CompiledTemplate, rows: List[Dict[str, Any]]) -> bytes:
+    prs = build_deck(template, rows)
+    out = io.BytesIO()
+    prs.save(out)
+    return out.getvalue()
+
+
+def render_deck(template_path: str, rows: List[Dict[str, Any]]) -> bytes:
+    """
+    Worker entry point: render one chunk of rows to .pptx bytes. The template
+    is compiled here from disk rather than taken from the parent's
+    template_cache, whose lock may have been held when the worker was forked.
+    """
+    with open(template_path, "rb") as f:
+        template = CompiledTemplate(template_path, os.path.getmtime(template_path), f.read())
+    return _deck_bytes(template, rows)
+
+
+# ---- merging partial decks ----
+
+_NS = {
+    "ct": "http://schemas.openxmlformats.org/package/2006/content-types",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+}
+_SLIDE_RELTYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide"
+_CONTENT_TYPES = "[Content_Types].xml"
+_PRESENTATION = "ppt/presentation.xml"
+_PRESENTATION_RELS = "ppt/_rels/presentation.xml.rels"
+# Parts that belong to one slide and are never shared with another, even when identical
+_PER_SLIDE_DIRS = ("ppt/slides/", "ppt/notesSlides/", "ppt/comments/")
+
+
+def _rels_name(partname: str) -> str:
+    return posixpath.join(posixpath.dirname(partname), "_rels", posixpath.basename(partname) + ".rels")
+
+
+def _xml_bytes(root) -> bytes:
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+class _DeckMerger:
+    """
+    Appends the slides of other decks rendered from the same template to a
+    base deck by copying package parts: each slide's XML and rels are copied
+    as bytes, and only [Content_Types].xml, presentation.xml and its rels are
+    parsed and extended. Parts a slide points at that the base already has
+    with the same bytes (layouts, masters, media) are shared; anything else
+    is copied under a fresh name.
+    """
+
+    def __init__(self, base: bytes):
+        with zipfile.ZipFile(io.BytesIO(base)) as zf:
+            self.parts = {name: zf.read(name) for name in zf.namelist()}
+        self.content_types = etree.fromstring(self.parts.pop(_CONTENT_TYPES))
+        self.presentation = etree.fromstring(self.parts.pop(_PRESENTATION))
+        self.presentation_rels = etree.fromstring(self.parts.pop(_PRESENTATION_RELS))
+        self.defaults = {d.get("Extension").lower() for d in self.content_types.findall("ct:Default", _NS)}
+        self.sld_id_lst = self.presentation.find("p:sldIdLst", _NS)
+        self.next_sld_id = max([int(s.get("id")) for s in self.sld_id_lst] + [255]) + 1
+        self.rids = {r.get("Id") for r in self.presentation_rels}
+        self._counters: Dict[tuple, int] = {}
+
+    def _fresh_name(self, partname: str) -> str:
+        stem, ext = posixpath.splitext(partname)
+        stem = re.sub(r"\d+$", "", stem)
+        n = self._counters.get((stem, ext), 1)
+        while f"{stem}{n}{ext}" in self.parts:
+            n += 1
+        self._counters[(stem, ext)] = n + 1
+        return f"{stem}{n}{ext}"
+
+    def _fresh_rid(self) -> str:
+        n = len(self.rids) + 1
+        while f"rId{n}" in self.rids:
+            n += 1
+        self.rids.add(f"rId{n}")
+        return f"rId{n}"
+
+    def _import_part(self, source, partname: str, imported: Dict[str, str]) -> str:
+        """Name of source's part in the merged package, copying it (and its rels) when needed."""
+        if partname in imported:
+            return imported[partname]
+        blob = source["parts"][partname]
+        shared = not partname.startswith(_PER_SLIDE_DIRS)
+        if shared and self.parts.get(partname) == blob:
+            imported[partname] = partname
+            return partname
+
+        new_name = self._fresh_name(partname)
+        imported[partname] = new_name
+        self.parts[new_name] = blob
+        ext = posixpath.splitext(new_name)[1][1:].lower()
+        override = source["overrides"].get("/" + partname)
+        if override is not None or ext not in self.defaults:
+            etree.SubElement(self.content_types, f"{{{_NS['ct']}}}Override",
+                             PartName="/" + new_name, ContentType=override or "application/octet-stream")
+
+        rels_blob = source["parts"].get(_rels_name(partname))
+        if rels_blob is not None:
+            rels = etree.fromstring(rels_blob)
+            folder, changed = posixpath.dirname(partname), False
+            for rel in rels:
+                if rel.get("TargetMode") == "External":
+                    continue
+                target = posixpath.normpath(posixpath.join(folder, rel.get("Target")))
+                new_target = self._import_part(source, target, imported)
+                if new_target != target:
+                    rel.set("Target", posixpath.relpath(new_target, posixpath.dirname(new_name)))
+                    changed = True
+            # Usually every target is shared, and the rels are copied unchanged
+            self.parts[_rels_name(new_name)] = _xml_bytes(rels) if changed else rels_blob
+        return new_name
+
+    def append(self, blob: bytes):
+        with zipfile.ZipFile(io.BytesIO(blob)) as zf:
+            parts = {name: zf.read(name) for name in zf.namelist()}
+        source = {
+            "parts": parts,
+            "overrides": {o.get("PartName"): o.get("ContentType")
+                          for o in etree.fromstring(parts[_CONTENT_TYPES]).findall("ct:Override", _NS)},
+        }
+        targets = {r.get("Id"): posixpath.normpath(posixpath.join("ppt", r.get("Target")))
+                   for r in etree.fromstring(parts[_PRESENTATION_RELS])}
+        slides = [targets[s.get(f"{{{_NS['r']}}}id")]
+                  for s in etree.fromstring(parts[_PRESENTATION]).find("p:sldIdLst", _NS)]
+
+        imported: Dict[str, str] = {}
+        for slide in slides:
+            name = self._import_part(source, slide, imported)
+            rid = self._fresh_rid()
+            etree.SubElement(self.presentation_rels, f"{{{_NS['rel']}}}Relationship",
+                             Id=rid, Type=_SLIDE_RELTYPE, Target=posixpath.relpath(name, "ppt"))
+            etree.SubElement(self.sld_id_lst, f"{{{_NS['p']}}}sldId",
+                             {"id": str(self.next_sld_id), f"{{{_NS['r']}}}id": rid})
+            self.next_sld_id += 1
+
+    def save(self, out: IO[bytes]):
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(_CONTENT_TYPES, _xml_bytes(self.content_types))
+            zf.writestr(_PRESENTATION, _xml_bytes(self.presentation))
+            zf.writestr(_PRESENTATION_RELS, _xml_bytes(self.presentation_rels))
+            for name, blob in self.parts.items():
+                if name == APP_PROPERTIES:
+                    blob = with_slide_count(blob, len(self.sld_id_lst))
+                zf.writestr(name, blob)
+
+
+def merge_decks(blobs: List[bytes], out: IO[bytes]):
+    """Concatenate partial decks, in order, into one .pptx written to out."""
+    merger = _DeckMerger(blobs[0])
+    for blob in blobs[1:]:
+        merger.append(blob)
+    merger.save(out)
+
+
+def chunk_rows(rows: List[Dict[str, Any]], workers: int, chunk_size: int | None = None):
+    size = chunk_size or math.ceil(len(rows) / max(workers, 1))
+    size = max(size, 1)
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+def render_parallel(template_path: str, rows: List[Dict[str, Any]],
+                    workers: int | None = None, chunk_size: int | None = None, progress=None) -> List[bytes]:
+    """
+    Render rows as one partial deck per chunk in a process pool.
+    The returned blobs are in the same order as the chunks of `rows`.
+    """
+    workers = workers or DEFAULT_WORKERS
+    chunks = chunk_rows(rows, workers, chunk_size)
+    blobs = []
+
+    def collect(results):
+        done = 0
+        for chunk, blob in zip(chunks, results):
+            blobs.append(blob)
+            done += len(chunk)
+            if progress:
+                progress(done, len(rows))
+
+    if workers <= 1 or len(chunks) == 1:
+        template = template_cache.get(template_path)
+        collect(_deck_bytes(template, chunk) for chunk in chunks)
+        return blobs
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        collect(pool.map(render_deck, [template_path] * len(chunks), chunks))
+    return blobs
+
+
+# ---- per-recipient output ----
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that ZipFile writes into and the generator drains."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def render_single(template: CompiledTemplate, row: Dict[str, Any]) -> bytes:
+    """Render one recipient's certificate with the same semantics as build_deck."""
+    prs = template.open()
+    fill_slide(prs.slides[0], row, template.placeholders)
+    out = io.BytesIO()
+    prs.save(out)
+    return out.getvalue()
+
+
+def certificate_entry_name(idx: int, row: Dict[str, Any]) -> str:
+    name = str(row.get("Name") or row.get("name") or "certificate").strip()
+    safe_name = re.sub(r'[^a-zA-Z0-9_-]', '_', name)[:60] or "certificate"
+    return f"{idx:04d}_{safe_name}.pptx"
+
+
+def iter_certificate_zip(template_path: str, rows: List[Dict[str, Any]]):
+    """
+    Yield a ZIP archive of one .pptx per row, chunk by chunk.
+    Only one rendered certificate is held in memory at a time.
+    """
+    template = template_cache.get(template_path)
+    sink = _ZipSink()
+    # .pptx files are already deflated, so they are stored as-is
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for idx, row in enumerate(rows, start=1):
+            zf.writestr(certificate_entry_name(idx, row), render_single(template, row))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
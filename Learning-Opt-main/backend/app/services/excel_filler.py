@@ -1,21 +1,201 @@
 # backend/app/services/excel_filler.py
-import io, os, re
+import csv, io, math, os, re, tempfile, zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Tuple
+from itertools import islice
+from typing import IO, Dict, Any, Iterator, List, NamedTuple, Tuple
 
 import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.worksheet.worksheet import Worksheet
 
-PLACEHOLDER_RE = re.compile(r"\{([^}]+)\}")
+from app.services.excel_stream import StreamingTemplateWriter, TemplateBook, template_book
+from app.services.sheet_placeholders import PLACEHOLDER_RE, PlaceholderIndex, cell_context, placeholder_index_for, resolve_column
+from app.services.workbook_templates import workbook_templates
+
+# Processes used to fill the workbooks of a split (ZIP) output
+EXCEL_WORKERS = int(os.getenv("EXCEL_WORKERS", "0")) or (os.cpu_count() or 1)
+
+
+class CsvUpload(NamedTuple):
+    """A details/grades pair uploaded as two CSV files instead of one two-sheet workbook."""
+    details: IO[bytes]
+    grades: IO[bytes]
+
+
+class CsvRows:
+    """
+    The rows of an uploaded CSV as {column: text} dicts, the way a sheet read
+    with dtype=str and blanks as "" gives them. Lines are parsed on every pass
+    instead of being held in memory; the first pass only reads the header and
+    counts the rows.
+    """
+
+    def __init__(self, source: IO[bytes]):
+        self.source = source
+        with self._lines() as lines:
+            self.columns = self._column_names(next(lines, []))
+            self._len = sum(1 for _ in lines)
+
+    @contextmanager
+    def _lines(self) -> Iterator[Iterator[List[str]]]:
+        self.source.seek(0)
+        text = io.TextIOWrapper(self.source, encoding="utf-8-sig", newline="")
+        try:
+            # Blank lines are skipped, as pandas does
+            yield (line for line in csv.reader(text) if line)
+        finally:
+            # Leave the caller's stream open; only stop reading through the wrapper
+            text.detach()
+
+    @staticmethod
+    def _column_names(header: List[str]) -> List[str]:
+        """Header names as pandas labels them: blanks become "Unnamed: i", repeats get .1, .2, ..."""
+        names, seen = [], {}
+        for i, name in enumerate(header):
+            name = name or f"Unnamed: {i}"
+            label = name
+            while label in seen:
+                seen[name] += 1
+                label = f"{name}.{seen[name]}"
+            seen[label] = 0
+            names.append(label)
+        return names
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        width = len(self.columns)
+        with self._lines() as lines:
+            next(lines, None)
+            for line in lines:
+                if len(line) < width:
+                    line += [""] * (width - len(line))
+                yield dict(zip(self.columns, line))
+
+    def __len__(self) -> int:
+        return self._len
+
+
+def _same_name(name):
+    return name
+
+
+def render_shard(template_path: str, details, mapping, col_for_name, grades_by_name, normalize_names: bool,
+                 engine: str, per_trainee: bool) -> List[bytes]:
+    """
+    Worker entry point: one shard's workbook as .xlsx bytes, or one workbook per
+    trainee with per_trainee. The template and its placeholder index are
+    built from disk here rather than taken from the parent's caches, whose
+    locks may have been held when the worker was forked.
+    """
+    filler = ExcelTemplateFiller(template_path)
+    match_key = filler._normalize_name if normalize_names else _same_name
+    book = TemplateBook(template_path, data_only=True) \
+        if engine == "stream" and os.path.exists(template_path) else None
+    blobs = []
+    for group in ([row] for row in details) if per_trainee else [details]:
+        if engine == "stream":
+            out = filler._stream_sheets(group, mapping, col_for_name, grades_by_name, match_key, book=book)
+        else:
+            out = filler._build_sheets(group, mapping, col_for_name, grades_by_name, match_key, pooled=False)
+        with out:
+            blobs.append(out.read())
+    return blobs
+
 
 class ExcelTemplateFiller:
     def __init__(self, template_path: str, default_mapping: Dict[str, Any] | None = None):
         self.template_path = template_path
         self.default_mapping = default_mapping or {}
 
-    def generate_from_filestorage(self, file_storage, mapping_json: str | None = None) -> Tuple[io.BytesIO, str]:
+    def generate_from_filestorage(self, file_storage, mapping_json: str | None = None, progress=None,
+                                  normalize_names: bool = False, engine: str = "openpyxl") -> Tuple[IO[bytes], str]:
+        mapping, details, col_for_name, grades_by_name = self._prepare_rows(file_storage, mapping_json, normalize_names)
+        match_key = self._normalize_name if normalize_names else _same_name
+
+        if engine == "stream":
+            out = self._stream_sheets(details, mapping, col_for_name, grades_by_name, match_key, progress)
+        else:
+            out = self._build_sheets(details, mapping, col_for_name, grades_by_name, match_key, progress)
+        out_name = f"filled_multi_sheets_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return out, out_name
+
+    def generate_zip_from_filestorage(self, file_storage, mapping_json: str | None = None, progress=None,
+                                      normalize_names: bool = False, engine: str = "openpyxl",
+                                      shards: int | None = None, per_trainee: bool = False,
+                                      workers: int | None = None) -> Tuple[IO[bytes], str]:
+        """
+        Same sheets as generate_from_filestorage, split across several workbooks
+        and returned as a ZIP: one workbook per shard of details rows, or one per
+        trainee with per_trainee. Shards are filled in a process pool.
+        """
+        mapping, details, col_for_name, grades_by_name = self._prepare_rows(file_storage, mapping_json, normalize_names)
+        match_key = self._normalize_name if normalize_names else _same_name
+        workers = workers or EXCEL_WORKERS
+        total = len(details)
+        size = math.ceil(total / max(shards or workers, 1))
+        # Shards are cut from the rows as they are read (CSV details are never a list)
+        rows = iter(details)
+        chunks = iter(lambda: list(islice(rows, size)), [])
+
+        def shard_args(chunk):
+            # Each worker only gets the grades rows its trainees match
+            names = (match_key(row.get(col_for_name, f"Row {i+1}")) for i, row in enumerate(chunk))
+            grades = {name: grades_by_name[name] for name in names if name in grades_by_name}
+            return (self.template_path, chunk, mapping, col_for_name, grades, normalize_names, engine, per_trainee)
+
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        out = tempfile.TemporaryFile()
+        done = 0
+        # .xlsx files are already deflated, so they are stored as-is
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+            def collect(results):
+                nonlocal done
+                for part, (chunk, blobs) in enumerate(results, start=1):
+                    if per_trainee:
+                        for row, blob in zip(chunk, blobs):
+                            done += 1
+                            zf.writestr(self._trainee_entry_name(done, row.get(col_for_name)), blob)
+                    else:
+                        done += len(chunk)
+                        zf.writestr(f"filled_multi_sheets_{stamp}_part{part:03d}.xlsx", blobs[0])
+                    if progress:
+                        progress(done, total)
+
+            def in_order(pool):
+                # At most `workers` shards wait in the pool, so the rows are never all in memory at once
+                pending = deque()
+                for chunk in chunks:
+                    pending.append((chunk, pool.submit(render_shard, *shard_args(chunk))))
+                    if len(pending) >= workers:
+                        chunk, future = pending.popleft()
+                        yield chunk, future.result()
+                while pending:
+                    chunk, future = pending.popleft()
+                    yield chunk, future.result()
+
+            if workers <= 1 or total <= size:
+                collect((chunk, render_shard(*shard_args(chunk))) for chunk in chunks)
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers, math.ceil(total / size))) as pool:
+                    collect(in_order(pool))
+        out.seek(0)
+        return out, f"filled_multi_sheets_{stamp}.zip"
+
+    def _prepare_rows(self, file_storage, mapping_json: str | None, normalize_names: bool):
+        """Mapping, details rows, the name column and the grades index for an upload."""
         mapping = self._merge_mapping(mapping_json)
+        name_key = next((k for k in mapping.keys() if k.upper() == "NAME"), "NAME")
+        col_for_name = mapping.get(name_key, name_key)
+
+        if isinstance(file_storage, CsvUpload):
+            details, grades = CsvRows(file_storage.details), CsvRows(file_storage.grades)
+            if not details.columns or not len(details):
+                raise ValueError("Details sheet has no rows.")
+            grades_by_name = self._index_grades(grades.columns, grades, col_for_name, normalize_names)
+            return mapping, details, col_for_name, grades_by_name
+
         xl = self._read_uploaded_excel(file_storage)
         if len(xl) < 2:
             raise ValueError("Uploaded file must have at least 2 worksheets: details and grades.")
@@ -27,30 +207,77 @@ class ExcelTemplateFiller:
         if df_details.empty:
             raise ValueError("Details sheet has no rows.")
 
-        wb, template_ws = self._load_template(self.template_path)
+        grades_by_name = self._index_grades(df_grades.columns, df_grades.to_dict("records"), col_for_name,
+                                            normalize_names)
+        return mapping, df_details.to_dict("records"), col_for_name, grades_by_name
+
+    def _build_sheets(self, details, mapping, col_for_name, grades_by_name, match_key, progress=None,
+                      pooled: bool = True) -> io.BytesIO:
+        wb, template_ws = self._load_template(self.template_path, pooled)
+        # Placeholder cells are the same on every copy: find them once, resolve columns once
+        index = placeholder_index_for(self.template_path, template_ws) if pooled \
+            else PlaceholderIndex.from_worksheet(template_ws)
+        bound = index.bind(mapping)
 
         used_titles = set()
-        for idx, row in df_details.iterrows():
-            row_dict = row.to_dict()
-            name_key = next((k for k in mapping.keys() if k.upper() == "NAME"), "NAME")
-            col_for_name = mapping.get(name_key, name_key)
+        for idx, row_dict in enumerate(details):
             candidate_name = row_dict.get(col_for_name, f"Row {idx+1}")
             new_title = self._safe_sheet_title(str(candidate_name), used_titles)
 
             ws_copy = self._copy_template_sheet_with_fallback(wb, template_ws, new_title)
 
-            matched_grades = df_grades[df_grades[col_for_name] == candidate_name]
-            grade_row = matched_grades.iloc[0].to_dict() if not matched_grades.empty else {}
-            combined_row = {**row_dict, **grade_row}
-            self._replace_placeholders_in_worksheet(ws_copy, mapping, combined_row)
+            grade_row = grades_by_name.get(match_key(candidate_name), {})
+            combined_row = self._combine_rows(row_dict, grade_row, col_for_name)
+            index.fill(ws_copy, mapping, combined_row, bound)
+            if progress:
+                progress(idx + 1, len(details))
 
         wb.remove(template_ws)
 
         out = io.BytesIO()
         wb.save(out)
         out.seek(0)
-        out_name = f"filled_multi_sheets_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        return out, out_name
+        return out
+
+    def _stream_sheets(self, details, mapping, col_for_name, grades_by_name, match_key, progress=None,
+                       book: TemplateBook | None = None) -> IO[bytes]:
+        """
+        Same sheets as _build_sheets, each replayed from the template and spooled
+        to disk as it is written. Without a book the shared template cache is used.
+        """
+        if not os.path.exists(self.template_path):
+            raise FileNotFoundError(f"Template not found on server: {self.template_path}")
+        if book is None:
+            book = template_book(self.template_path, data_only=True)
+        if not book.sheet_names:
+            raise RuntimeError("Template has no worksheets.")
+        template = book.sheets[book.sheet_names[0]]
+        index = PlaceholderIndex.from_cells(
+            (r, c, value) for r, cells in template.rows.items() for c, (value, _) in cells.items()
+        )
+        bound = index.bind(mapping)
+
+        writer = StreamingTemplateWriter(book, full_calc_on_load=False)
+        used_titles = set()
+        for idx, row_dict in enumerate(details):
+            candidate_name = row_dict.get(col_for_name, f"Row {idx+1}")
+            sheet = writer.sheet(template.title, self._safe_sheet_title(str(candidate_name), used_titles))
+
+            grade_row = grades_by_name.get(match_key(candidate_name), {})
+            by_row: Dict[int, Dict[int, Any]] = {}
+            combined_row = self._combine_rows(row_dict, grade_row, col_for_name)
+            for (r, c), text in index.values(mapping, combined_row, bound).items():
+                by_row.setdefault(r, {})[c] = text
+            for r in sorted(by_row):
+                sheet.write_row(r, by_row[r])
+            sheet.close()
+            if progress:
+                progress(idx + 1, len(details))
+
+        out = tempfile.TemporaryFile()
+        writer.save(out)
+        out.seek(0)
+        return out
 
     # ---- helpers ----
     def _merge_mapping(self, mapping_json: str | None) -> Dict[str, Any]:
@@ -64,37 +291,57 @@ class ExcelTemplateFiller:
         xl = pd.read_excel(file_storage, sheet_name=None, dtype=str)
         return {k: v.fillna("") for k, v in xl.items()}
 
-    def _load_template(self, template_path: str):
+    @staticmethod
+    def _normalize_name(name) -> str:
+        return " ".join(str(name).split()).casefold()
+
+    def _index_grades(self, columns, grade_rows, col_for_name: str, normalize: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Name -> first grades row with that name, so each trainee is matched with one dict lookup."""
+        if col_for_name not in columns:
+            raise ValueError(f"Grades sheet has no '{col_for_name}' column to match trainees on.")
+        index: Dict[str, Dict[str, Any]] = {}
+        for grade_row in grade_rows:
+            name = grade_row[col_for_name]
+            index.setdefault(self._normalize_name(name) if normalize else name, grade_row)
+        return index
+
+    @staticmethod
+    def _combine_rows(row_dict: Dict[str, Any], grade_row: Dict[str, Any], col_for_name: str) -> Dict[str, Any]:
+        """Details row plus its grades; the name stays as the details spell it, whatever matched it."""
+        combined = {**row_dict, **grade_row}
+        if col_for_name in row_dict:
+            combined[col_for_name] = row_dict[col_for_name]
+        return combined
+
+    def _load_template(self, template_path: str, pooled: bool = True):
         if not os.path.exists(template_path):
             raise FileNotFoundError(f"Template not found on server: {template_path}")
-        wb = load_workbook(template_path, data_only=True)
+        if pooled:
+            wb = workbook_templates.checkout(template_path, data_only=True)
+        else:
+            wb = load_workbook(template_path, data_only=True)
         if not wb.worksheets:
             raise RuntimeError("Template has no worksheets.")
         return wb, wb.worksheets[0]
 
-    def _replace_placeholders_in_worksheet(self, ws: Worksheet, mapping: Dict[str, Any], rowdict: Dict[str, Any]):
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=ws.max_column):
-            for cell in row:
-                if isinstance(cell.value, str) and "{" in cell.value and "}" in cell.value:
-                    cell.value = self._replace_placeholders_in_cell(cell.value, mapping, rowdict)
+    def _replace_placeholders_in_worksheet(self, ws: Worksheet, mapping: Dict[str, Any], rowdict: Dict[str, Any],
+                                           index: PlaceholderIndex | None = None):
+        (index or PlaceholderIndex.from_worksheet(ws)).fill(ws, mapping, rowdict)
 
     def _replace_placeholders_in_cell(self, text: str, mapping: Dict[str, Any], rowdict: Dict[str, Any]) -> str:
-        context = None
-        up = text.upper()
-        if "YEAR LAST ATTENDED" in up:
-            if "ELEMENTARY" in up: context = "ELEMENTARY"
-            elif "SECONDARY" in up: context = "SECONDARY"
-            elif "TERTIARY" in up: context = "TERTIARY"
+        context = cell_context(text)
 
         def repl(m):
-            key = m.group(1)
-            mp = mapping.get(key, key)
-            col = (mp.get(context) or mp.get("DEFAULT")) if isinstance(mp, dict) else mp
-            val = rowdict.get(col, "")
+            val = rowdict.get(resolve_column(mapping, m.group(1), context), "")
             return "" if val is None else str(val)
 
         return PLACEHOLDER_RE.sub(repl, text)
 
+    @staticmethod
+    def _trainee_entry_name(idx: int, name) -> str:
+        safe_name = re.sub(r'[^a-zA-Z0-9_-]', '_', str(name or "").strip())[:60] or "trainee"
+        return f"{idx:04d}_{safe_name}.xlsx"
+
     def _safe_sheet_title(self, s: str, used: set) -> str:
         title = (s or "").strip() or "Row"
         for ch in '[]:*?/\\':
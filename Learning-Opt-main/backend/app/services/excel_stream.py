@@ -0,0 +1,241 @@
+# backend/app/services/excel_stream.py
+import io, os, threading
+from copy import copy
+from typing import Any, Dict, List, Tuple
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.drawing.image import Image
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.dimensions import ColumnDimension, RowDimension
+
+from app.services.merged_cells import MergedCellIndex
+
+# The writer reuses a few openpyxl internals to stay fast: the workbook font table (wb._fonts),
+# a cell's style array (cell._style) and a sheet's images (ws._images, Image._data).
+# They are not public API, which is why requirements.txt pins openpyxl to an exact version.
+
+# "openpyxl" builds the whole workbook in memory; "stream" replays the template through a write-only workbook
+EXCEL_ENGINE = os.getenv("EXCEL_ENGINE", "openpyxl")
+ENGINES = ("openpyxl", "stream")
+
+
+def requested_engine(req) -> str:
+    """engine=stream|openpyxl from the query string, form or JSON body, else EXCEL_ENGINE."""
+    engine = req.args.get("engine") or req.form.get("engine")
+    if engine is None and req.is_json:
+        engine = (req.get_json(silent=True) or {}).get("engine")
+    engine = str(engine or EXCEL_ENGINE).lower()
+    return engine if engine in ENGINES else EXCEL_ENGINE
+
+
+class TemplateSheet:
+    """A template sheet captured for replay: cells per row, and the sheet-level layout."""
+
+    def __init__(self, ws, style_of):
+        self.title = ws.title
+        self.max_row = ws.max_row
+        self.rows: Dict[int, Dict[int, Tuple[Any, int | None]]] = {}
+        for row in ws.iter_rows():
+            for cell in row:
+                if cell.value is None and not cell.has_style:
+                    continue
+                self.rows.setdefault(cell.row, {})[cell.column] = (
+                    cell.value, style_of(cell) if cell.has_style else None
+                )
+
+        self.merged = [CellRange(str(rng)) for rng in ws.merged_cells.ranges]
+        self.merged_index = MergedCellIndex(self.merged)
+        # Plain attributes only: dimension styles are indexes into the template's style table
+        self.column_dimensions = [
+            dict(index=dim.index, width=dim.width, hidden=dim.hidden, outlineLevel=dim.outlineLevel,
+                 collapsed=dim.collapsed, min=dim.min, max=dim.max)
+            for dim in ws.column_dimensions.values()
+        ]
+        self.row_dimensions = {
+            idx: dict(ht=dim.ht, customHeight=dim.customHeight, hidden=dim.hidden,
+                      outlineLevel=dim.outlineLevel, collapsed=dim.collapsed)
+            for idx, dim in ws.row_dimensions.items()
+        }
+        self.freeze_panes = ws.freeze_panes
+        self.sheet_format = copy(ws.sheet_format)
+        self.sheet_properties = copy(ws.sheet_properties)
+        self.page_margins = copy(ws.page_margins)
+        self.print_options = copy(ws.print_options)
+        self.page_setup = copy(ws.page_setup)
+        self.header_footer = copy(ws.HeaderFooter)
+        self.views = copy(ws.views)
+        self.print_title_rows = ws.print_title_rows
+        self.print_title_cols = ws.print_title_cols
+        self.row_breaks = copy(ws.row_breaks)
+        self.col_breaks = copy(ws.col_breaks)
+        self.conditional_formatting = [(cf.sqref, list(cf.rules)) for cf in ws.conditional_formatting]
+        self.data_validations = [copy(dv) for dv in ws.data_validations.dataValidation]
+        # Image bytes are read once here; every output gets fresh Image objects
+        self.images = [(img._data(), img.anchor, img.width, img.height) for img in ws._images]
+
+
+class TemplateBook:
+    """Every sheet of a template workbook plus the distinct cell styles they use."""
+
+    def __init__(self, path: str, data_only: bool = False):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        wb = load_workbook(path, data_only=data_only)
+        self.default_font = copy(wb._fonts[0])
+        self.styles: List[tuple] = []
+        style_ids: Dict[int, int] = {}
+
+        def style_of(cell):
+            key = style_ids.get(cell.style_id)
+            if key is None:
+                key = style_ids[cell.style_id] = len(self.styles)
+                self.styles.append((copy(cell.font), copy(cell.border), copy(cell.fill),
+                                    cell.number_format, copy(cell.protection), copy(cell.alignment)))
+            return key
+
+        self.sheets = {ws.title: TemplateSheet(ws, style_of) for ws in wb.worksheets}
+        self.sheet_names = list(self.sheets)
+
+
+_books: Dict[Tuple[str, bool], TemplateBook] = {}
+_lock = threading.Lock()
+
+
+def template_book(path: str, data_only: bool = False) -> TemplateBook:
+    """Captured template, reloaded when the file's mtime changes."""
+    key = (os.path.abspath(path), data_only)
+    with _lock:
+        book = _books.get(key)
+    if book is None or book.mtime != os.path.getmtime(key[0]):
+        book = TemplateBook(key[0], data_only)
+        with _lock:
+            _books[key] = book
+    return book
+
+
+class SheetStream:
+    """
+    One output sheet. Rows must be written in ascending order; template rows
+    in between (and after the last data row, on close) are replayed as-is.
+    """
+
+    def __init__(self, writer: "StreamingTemplateWriter", source: TemplateSheet, title: str,
+                 unmerge: bool = False, skip_merged: bool = False):
+        self.writer = writer
+        self.source = source
+        self.ws = ws = writer.wb.create_sheet(title)
+        self._next_row = 1
+        self._closed = False
+
+        for dim in source.column_dimensions:
+            ws.column_dimensions[dim["index"]] = ColumnDimension(ws, **dim)
+        for idx, dim in source.row_dimensions.items():
+            ws.row_dimensions[idx] = RowDimension(ws, index=idx, **dim)
+        ws.views = copy(source.views)
+        # Only the first sheet opens selected, however many copies of one template sheet are written
+        ws.sheet_view.tabSelected = True if len(writer.wb.worksheets) == 1 else None
+        ws.freeze_panes = source.freeze_panes
+        ws.sheet_format = copy(source.sheet_format)
+        ws.sheet_properties = copy(source.sheet_properties)
+        ws.page_margins = copy(source.page_margins)
+        ws.print_options = copy(source.print_options)
+        ws.page_setup = copy(source.page_setup)
+        ws.HeaderFooter = copy(source.header_footer)
+        ws.print_title_rows = source.print_title_rows
+        ws.print_title_cols = source.print_title_cols
+        ws.row_breaks = copy(source.row_breaks)
+        ws.col_breaks = copy(source.col_breaks)
+        for sqref, rules in source.conditional_formatting:
+            for rule in rules:
+                ws.conditional_formatting.add(str(sqref), copy(rule))
+        for dv in source.data_validations:
+            ws.add_data_validation(copy(dv))
+        for data, anchor, width, height in source.images:
+            img = Image(io.BytesIO(data))
+            img.anchor, img.width, img.height = copy(anchor), width, height
+            ws.add_image(img)
+
+        # Writes to non-anchor cells of merged ranges are dropped (like is_top_left_merged_cell)
+        self._merged = None
+        if not unmerge:
+            for rng in source.merged:
+                ws.merged_cells.add(CellRange(rng.coord))
+            if skip_merged:
+                self._merged = source.merged_index
+
+    def write_row(self, row_idx: int, values: Dict[int, Any], number_formats: Dict[int, str] | None = None):
+        """Write {column: value} over template row row_idx."""
+        if row_idx < self._next_row:
+            raise ValueError(f"Row {row_idx} of '{self.ws.title}' was already written")
+        while self._next_row < row_idx:
+            self._append(self._next_row, {}, None)
+        self._append(row_idx, values, number_formats)
+
+    def _append(self, row_idx: int, values: Dict[int, Any], number_formats: Dict[int, str] | None):
+        template_cells = self.source.rows.get(row_idx, {})
+        cells = []
+        for col in sorted(template_cells.keys() | values.keys()):
+            value, style = template_cells.get(col, (None, None))
+            if col in values and (self._merged is None or self._merged.is_top_left(row_idx, col)):
+                value = values[col]
+            cell = WriteOnlyCell(self.ws, value)
+            if style is not None:
+                self.writer.apply_style(cell, style)
+            if number_formats and col in number_formats:
+                cell.number_format = number_formats[col]
+            cells.append((col, cell))
+
+        row = [None] * (cells[-1][0] if cells else 0)
+        for col, cell in cells:
+            row[col - 1] = cell
+        self.ws.append(row)
+        self._next_row = row_idx + 1
+
+    def close(self):
+        """Replay the rest of the template and finish the sheet's temp file."""
+        if self._closed:
+            return
+        while self._next_row <= self.source.max_row:
+            self._append(self._next_row, {}, None)
+        self.ws.close()
+        self._closed = True
+
+
+class StreamingTemplateWriter:
+    """
+    Writes a copy of a template with openpyxl's write-only mode: every sheet
+    is spooled to a temp file row by row, so memory stays flat however many
+    rows or sheets are written.
+    """
+
+    def __init__(self, book: TemplateBook, full_calc_on_load: bool = True):
+        self.book = book
+        self.wb = Workbook(write_only=True)
+        # Unstyled cells use font 0, so it has to be the template's default font
+        self.wb._fonts = IndexedList([book.default_font])
+        if full_calc_on_load:
+            self.wb.calculation.fullCalcOnLoad = True
+        self._styles: Dict[int, Any] = {}
+        self._sheets: List[SheetStream] = []
+
+    def sheet(self, source_title: str, title: str | None = None,
+              unmerge: bool = False, skip_merged: bool = False) -> SheetStream:
+        stream = SheetStream(self, self.book.sheets[source_title], title or source_title, unmerge, skip_merged)
+        self._sheets.append(stream)
+        return stream
+
+    def apply_style(self, cell, style: int):
+        # Style objects are registered with this workbook once; later cells reuse the style array
+        array = self._styles.get(style)
+        if array is None:
+            cell.font, cell.border, cell.fill, cell.number_format, cell.protection, cell.alignment = self.book.styles[style]
+            self._styles[style] = copy(cell._style)
+        else:
+            cell._style = copy(array)
+
+    def save(self, fileobj):
+        for stream in self._sheets:
+            stream.close()
+        self.wb.save(fileobj)
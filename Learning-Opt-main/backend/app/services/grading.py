@@ -0,0 +1,99 @@
+# backend/app/services/grading.py
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+WRITTEN_FIELDS = ("wi", "co", "5s", "bo", "cbo", "sdg")
+PERFORMANCE_FIELDS = ("ohsa", "we", "ujc", "iso", "po", "hr", "perdev", "supp", "ds")
+# (minimum total_score, letter), highest first; anything below the last cutoff gets FAILING_GRADE
+GRADE_CUTOFFS = ((90, "A"), (80, "B"), (70, "C"), (60, "D"))
+FAILING_GRADE = "F"
+
+RESULT_FIELDS = ("total_score", "written_rating", "performance_rating", "final_grade", "remarks")
+
+
+def to_score(value) -> float:
+    """A score cell as float: blanks are 0 and unparseable text counts as 0."""
+    try:
+        return float(value or 0)
+    except ValueError:
+        return 0.0
+
+
+def _column_sum(block: np.ndarray) -> np.ndarray:
+    # Columns are added one at a time so every row matches a left-to-right sum() exactly
+    total = np.zeros(len(block))
+    for j in range(block.shape[1]):
+        total += block[:, j]
+    return total
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    # Python's round() (correctly rounded), not np.round: ratings already stored must not shift by 0.01
+    return np.array([round(v, 2) for v in values.tolist()], dtype=float)
+
+
+class Grader:
+    """
+    Totals, ratings and letter grades for a whole roster at once.
+
+    Scores are laid out as one float column per field, so the sums, means and
+    the grade lookup are a handful of NumPy operations however many students
+    there are.
+    """
+
+    def __init__(self, written_fields: Sequence[str] = WRITTEN_FIELDS,
+                 performance_fields: Sequence[str] = PERFORMANCE_FIELDS,
+                 cutoffs: Sequence[Tuple[float, str]] = GRADE_CUTOFFS, failing_grade: str = FAILING_GRADE):
+        if not written_fields or not performance_fields:
+            raise ValueError("Grader needs at least one written and one performance field.")
+        self.written_fields = tuple(written_fields)
+        self.performance_fields = tuple(performance_fields)
+        self.fields = self.written_fields + self.performance_fields
+        self.cutoffs = tuple(sorted(cutoffs, key=lambda c: c[0], reverse=True))
+        self.failing_grade = failing_grade
+
+    def score_block(self, rows: Iterable[Dict[str, Any]], key: Callable[[str], str] | None = None) -> np.ndarray:
+        """(students x fields) float array read from row dicts; key maps a field to its dict key."""
+        keys = [key(f) if key else f for f in self.fields]
+        rows = list(rows)
+        block = np.zeros((len(rows), len(keys)))
+        for i, row in enumerate(rows):
+            block[i] = [to_score(row.get(k)) for k in keys]
+        return block
+
+    def grade_block(self, block: np.ndarray) -> pd.DataFrame:
+        """One row per student: total_score, written_rating, performance_rating, final_grade, remarks."""
+        n_written = len(self.written_fields)
+        written = _column_sum(block[:, :n_written])
+        performance = _column_sum(block[:, n_written:])
+        total = _column_sum(block)
+
+        final_grade = np.select(
+            [total >= cutoff for cutoff, _ in self.cutoffs],
+            [letter for _, letter in self.cutoffs],
+            default=self.failing_grade,
+        )
+        return pd.DataFrame({
+            "total_score": total,
+            "written_rating": _round2(written / n_written),
+            "performance_rating": _round2(performance / len(self.performance_fields)),
+            "final_grade": final_grade,
+            "remarks": np.where(final_grade != self.failing_grade, "Passed", "Failed"),
+        })
+
+    def grade(self, rows: Iterable[Dict[str, Any]], key: Callable[[str], str] | None = None) -> List[Dict[str, Any]]:
+        """
+        Per row, its scores as floats followed by the grading results, all
+        named through key (e.g. str.upper for WI ... FINAL_GRADE), ready to
+        dict.update() onto the row.
+        """
+        block = self.score_block(rows, key)
+        frame = pd.concat([pd.DataFrame(block, columns=list(self.fields)), self.grade_block(block)], axis=1)
+        if key:
+            frame = frame.rename(columns=key)
+        return frame.to_dict("records")
+
+
+grader = Grader()
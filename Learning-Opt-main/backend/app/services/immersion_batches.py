@@ -0,0 +1,56 @@
+# backend/app/services/immersion_batches.py
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+from app import config
+
+# One statement for both cases: a new pair is inserted, an existing one (unique key
+# uq_school_batch) hands back its id through LAST_INSERT_ID(id)
+UPSERT_BATCH_SQL = """
+    INSERT INTO immersion_batches (school, batch) VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+"""
+
+Pair = Tuple[str, str]
+
+
+class BatchRegistry:
+    """
+    immersion_batches ids by (school, batch). A pair is upserted once and its
+    id kept in a small in-process LRU, so a roster of one school/batch costs
+    one round trip, and repeat uploads of it none.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._ids: "OrderedDict[Pair, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, school: str, batch: str) -> int | None:
+        """Id of the pair, registering it if needed; None when school or batch is blank."""
+        if not (school and batch):
+            return None
+        key = (school, batch)
+        with self._lock:
+            batch_id = self._ids.get(key)
+            if batch_id is not None:
+                self._ids.move_to_end(key)
+                return batch_id
+        batch_id = config.execute_insert(UPSERT_BATCH_SQL, key)
+        with self._lock:
+            self._ids[key] = batch_id
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+        return batch_id
+
+    def resolve_many(self, pairs: Iterable[Pair]) -> Dict[Pair, int | None]:
+        """Ids for every distinct pair, one upsert per pair not already cached."""
+        return {pair: self.resolve(*pair) for pair in dict.fromkeys(pairs)}
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+batch_registry = BatchRegistry()
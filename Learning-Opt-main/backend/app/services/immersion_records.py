@@ -0,0 +1,62 @@
+# backend/app/services/immersion_records.py
+from typing import Any, Callable, Dict, List, Sequence
+
+from app import config
+from app.services.grading import grader
+
+INSERT_RECORD_SQL = """
+    INSERT INTO immersion_records (
+        last_name, first_name, middle_name, strand, department,
+        WI, CO, 5S, BO, CBO, SDG,
+        OHSA, WE, UJC, ISO, PO, HR,
+        PERDEV, SUPP, DS,
+        total_score, written_rating, performance_rating, final_grade, remarks
+    )
+    VALUES (
+        %s, %s, %s, %s, %s,
+        %s, %s, %s, %s, %s, %s,
+        %s, %s, %s, %s, %s, %s,
+        %s, %s, %s,
+        %s, %s, %s, %s, %s
+    )
+"""
+
+NAME_FIELDS = ("last_name", "first_name", "middle_name", "strand", "department")
+
+
+def record_params(row: Dict[str, Any], key: Callable[[str], str] | None = None) -> tuple:
+    """INSERT_RECORD_SQL parameters for a graded row; key maps field names to the row's keys (e.g. str.upper)."""
+    k = key or (lambda f: f)
+    return (
+        *(row[k(f)] for f in NAME_FIELDS),
+        *(int(row[k(f)]) for f in grader.fields),
+        float(row[k("total_score")]), float(row[k("written_rating")]), float(row[k("performance_rating")]),
+        row[k("final_grade")], row[k("remarks")],
+    )
+
+
+def insert_records(rows: Sequence[Dict[str, Any]], key: Callable[[str], str] | None = None,
+                   progress=None) -> List[Dict[str, Any]]:
+    """
+    Insert graded rows into immersion_records in one bulk transaction.
+    Returns the rows that could not be stored: [{"row", "last_name", "first_name", "error"}].
+    """
+    k = key or (lambda f: f)
+    failed, params, positions = [], [], []
+
+    def fail(i, error):
+        failed.append({"row": i, "last_name": rows[i].get(k("last_name")),
+                       "first_name": rows[i].get(k("first_name")), "error": str(error)})
+
+    for i, row in enumerate(rows):
+        try:
+            params.append(record_params(row, key))
+            positions.append(i)
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            fail(i, e)
+
+    result = config.execute_many(INSERT_RECORD_SQL, params, progress=progress)
+    for failure in result["failed"]:
+        fail(positions[failure["index"]], failure["error"])
+    failed.sort(key=lambda f: f["row"])
+    return failed
@@ -0,0 +1,281 @@
+# backend/app/services/ingestion.py
+import json, os, queue, tempfile, threading, traceback, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List
+
+from app.services.grading import grader
+from app.services.immersion_records import insert_records
+from app.services.roster_reader import ROSTER_WIDTH, open_roster
+from app.services.upload_ledger import upload_ledger
+
+# How many rosters are ingested at once; each one uses a writer plus a reader and a grader thread
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "3"))
+INGEST_CHUNK = int(os.getenv("INGEST_CHUNK", "500"))
+# Chunks that may wait between two stages before the faster one blocks
+INGEST_QUEUE = int(os.getenv("INGEST_QUEUE", "4"))
+# Finished ingestions kept for the status endpoint
+INGEST_HISTORY = int(os.getenv("INGEST_HISTORY", "200"))
+
+FINISHED = ("done", "failed")
+
+_END = object()
+
+
+class IngestionAborted(Exception):
+    pass
+
+
+class Ingestion:
+    """State of one roster going through the pipeline, as reported by /api/ingestions/<id>."""
+
+    def __init__(self, kind: str, digest: str | None = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.digest = digest
+        self.status = "queued"
+        self.school = self.batch = ""
+        self.parsed = self.graded = self.persisted = 0
+        self.failed: List[Dict[str, Any]] = []
+        self.result: Dict[str, Any] | None = None
+        self.error: str | None = None
+        self.created_at = self.updated_at = self._now()
+        self.abort = threading.Event()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.updated_at = self._now()
+
+    def add(self, counter: str, n: int):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+            self.updated_at = self._now()
+
+    def stored(self, n: int, failed: List[Dict[str, Any]]):
+        with self._lock:
+            self.persisted += n
+            self.failed.extend(failed)
+            self.updated_at = self._now()
+
+    def fail(self, error: Exception):
+        self.abort.set()
+        with self._lock:
+            if self.status != "failed":
+                self.status, self.error = "failed", str(error)
+            self.updated_at = self._now()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "school": self.school,
+                "batch": self.batch,
+                "parsed": self.parsed,
+                "graded": self.graded,
+                "persisted": self.persisted,
+                "failed": list(self.failed),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            }
+
+
+class SpooledRows:
+    """Rows the writer has stored, kept on disk as JSON lines so memory does not grow with the roster."""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._count = 0
+
+    def extend(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            self._file.write(json.dumps(row, default=str) + "\n")
+        self._count += len(rows)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self._file.seek(0)
+        for line in self._file:
+            yield json.loads(line)
+        self._file.seek(0, os.SEEK_END)
+
+    def close(self):
+        self._file.close()
+
+
+def _put(q: queue.Queue, item, abort: threading.Event):
+    while True:
+        if abort.is_set():
+            raise IngestionAborted()
+        try:
+            q.put(item, timeout=0.2)
+            return
+        except queue.Full:
+            pass
+
+
+def _get(q: queue.Queue, abort: threading.Event):
+    while True:
+        if abort.is_set():
+            raise IngestionAborted()
+        try:
+            return q.get(timeout=0.2)
+        except queue.Empty:
+            pass
+
+
+class IngestionPipeline:
+    """
+    Roster ingestion as three stages joined by bounded queues:
+
+        reader (roster rows -> row dicts) -> grader -> writer (insert_records)
+
+    Rows travel in chunks of chunk_size, so parsing, grading and the DB
+    inserts of one roster overlap and memory between stages stays bounded.
+    Each ingestion runs its writer on one of `workers` coordinator threads
+    and its reader and grader on a stage pool of twice that size, so a busy
+    pool can delay an ingestion but never starve one that has started.
+
+    Ingestions live in memory only; a restart forgets them.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, chunk_size: int = INGEST_CHUNK,
+                 queue_size: int = INGEST_QUEUE, history: int = INGEST_HISTORY):
+        workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.queue_size = max(1, queue_size)
+        self.history = history
+        self.coordinators = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.stages = ThreadPoolExecutor(max_workers=2 * workers, thread_name_prefix="ingest-stage")
+        self._ingestions: "OrderedDict[str, Ingestion]" = OrderedDict()
+        self._active: Dict[tuple, Ingestion] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, source, parse_row: Callable, key: Callable[[str], str] | None = None,
+               start: Callable | None = None, finish: Callable | None = None,
+               digest: str | None = None, filename: str | None = None, keep_rows: bool = False) -> Ingestion:
+        """
+        Queue a roster for ingestion and return its Ingestion at once.
+
+        parse_row(row, school, batch) turns a roster row into the dict that is
+        graded and stored (key as for grader.grade/insert_records).
+        start(school, batch) runs before the first insert, finish(ingestion,
+        rows) builds the result once every row is stored; rows is None unless
+        keep_rows, then the stored rows are read back from a disk spool rather
+        than held in memory. With a digest the
+        result goes to the uploads ledger, and a second submit of the same
+        file while the first is running gets the running ingestion back.
+        A filename ending in .csv is read as CSV, anything else as .xlsx.
+        """
+        with self._lock:
+            if digest is not None:
+                running = self._active.get((digest, kind))
+                if running is not None:
+                    return running
+            ingestion = Ingestion(kind, digest)
+            self._ingestions[ingestion.id] = ingestion
+            if digest is not None:
+                self._active[(digest, kind)] = ingestion
+            self._trim()
+        self.coordinators.submit(self._run, ingestion, source, filename, parse_row, key, start, finish, keep_rows)
+        return ingestion
+
+    def get(self, ingestion_id: str) -> Ingestion | None:
+        with self._lock:
+            return self._ingestions.get(ingestion_id)
+
+    def _trim(self):
+        finished = [i for i, ing in self._ingestions.items() if ing.status in FINISHED]
+        for ingestion_id in finished[:max(0, len(self._ingestions) - self.history)]:
+            del self._ingestions[ingestion_id]
+
+    # ---- stages ----
+    def _read(self, ingestion: Ingestion, source, filename, parse_row, out: queue.Queue):
+        with open_roster(source, filename, min_width=ROSTER_WIDTH) as roster:
+            school, batch = roster.school, roster.batch
+            ingestion.update(school=school, batch=batch)
+            chunk = []
+            for row in roster.rows():
+                if not any(row):
+                    continue
+                chunk.append(parse_row(row, school, batch))
+                if len(chunk) >= self.chunk_size:
+                    _put(out, chunk, ingestion.abort)
+                    ingestion.add("parsed", len(chunk))
+                    chunk = []
+            if chunk:
+                _put(out, chunk, ingestion.abort)
+                ingestion.add("parsed", len(chunk))
+        _put(out, _END, ingestion.abort)
+
+    def _grade(self, ingestion: Ingestion, key, inbox: queue.Queue, out: queue.Queue):
+        while (chunk := _get(inbox, ingestion.abort)) is not _END:
+            for row, graded in zip(chunk, grader.grade(chunk, key=key)):
+                row.update(graded)
+            _put(out, chunk, ingestion.abort)
+            ingestion.add("graded", len(chunk))
+        _put(out, _END, ingestion.abort)
+
+    def _stage(self, fn, ingestion: Ingestion, *args):
+        try:
+            fn(ingestion, *args)
+        except IngestionAborted:
+            pass
+        except Exception as e:
+            traceback.print_exc()
+            ingestion.fail(e)
+
+    def _run(self, ingestion: Ingestion, source, filename, parse_row, key, start, finish, keep_rows):
+        ingestion.update(status="running")
+        parsed, graded = queue.Queue(self.queue_size), queue.Queue(self.queue_size)
+        self.stages.submit(self._stage, self._read, ingestion, source, filename, parse_row, parsed)
+        self.stages.submit(self._stage, self._grade, ingestion, key, parsed, graded)
+        rows = SpooledRows() if keep_rows else None
+        try:
+            # Writer: this thread stores each graded chunk as it arrives; only counts stay in memory
+            count = 0
+            chunk = _get(graded, ingestion.abort)
+            if start:
+                start(ingestion.school, ingestion.batch)
+            while chunk is not _END:
+                failed = insert_records(chunk, key=key)
+                for failure in failed:
+                    failure["row"] += count
+                if rows is not None:
+                    rows.extend(chunk)
+                count += len(chunk)
+                ingestion.stored(len(chunk) - len(failed), failed)
+                chunk = _get(graded, ingestion.abort)
+
+            result = finish(ingestion, rows) if finish else {"count": count}
+            ingestion.update(status="done", result=result)
+            if ingestion.digest is not None:
+                upload_ledger.record(ingestion.digest, ingestion.kind, ingestion.school, ingestion.batch,
+                                     count, result)
+        except IngestionAborted:
+            pass
+        except Exception as e:
+            traceback.print_exc()
+            ingestion.fail(e)
+        finally:
+            if rows is not None:
+                rows.close()
+            with self._lock:
+                if ingestion.digest is not None and self._active.get((ingestion.digest, ingestion.kind)) is ingestion:
+                    del self._active[(ingestion.digest, ingestion.kind)]
+
+
+ingestion_pipeline = IngestionPipeline()
@@ -0,0 +1,171 @@
+# backend/app/services/jobs.py
+import json, os, shutil, sqlite3, tempfile, threading, time, traceback, uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import IO, Any, Callable, Dict
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(BASE_DIR, "static", "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# Terminal states; anything else is still queued or running
+FINISHED = ("done", "failed", "cancelled", "interrupted")
+
+
+def spooled_copy(stream) -> IO[bytes]:
+    """Copy of an uploaded file for work that outlives the request, which closes its stream; kept on disk."""
+    stream.seek(0)
+    copy = tempfile.TemporaryFile()
+    shutil.copyfileobj(stream, copy, 1 << 16)
+    copy.seek(0)
+    return copy
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    """Job state in a local SQLite file so status survives a process restart."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    result_path TEXT,
+                    download_name TEXT,
+                    mimetype TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            # Work that was in flight when the process died cannot be resumed
+            conn.execute(
+                "UPDATE jobs SET status='interrupted', error='Server restarted before the job finished', updated_at=? "
+                "WHERE status IN ('queued', 'running')",
+                (self._now(),)
+            )
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, kind: str, total: int = 0) -> str:
+        job_id = uuid.uuid4().hex
+        now = self._now()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, total, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, total, now, now)
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = self._now()
+        cols = ", ".join(f"{k}=?" for k in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Dict[str, Any] | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class JobQueue:
+    """
+    Runs generation work on a local thread pool.
+
+    The job function is called as fn(progress, *args) and returns a dict with
+    an optional "path"/"download_name"/"mimetype" for the downloadable result;
+    everything else is stored as the job's JSON result. progress(done, total)
+    records progress and raises JobCancelled once cancellation is requested.
+    """
+
+    def __init__(self, store: JobStore, workers: int):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._cancelled = set()
+
+    def submit(self, kind: str, fn: Callable, *args, total: int = 0) -> str:
+        job_id = self.store.create(kind, total)
+        self.executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return False
+        self._cancelled.add(job_id)
+        self.store.update(job_id, cancel_requested=1)
+        return True
+
+    def _progress_callback(self, job_id: str):
+        last_write = [0.0]
+
+        def progress(done: int, total: int):
+            if job_id in self._cancelled:
+                raise JobCancelled()
+            now = time.monotonic()
+            # Throttle SQLite writes; always record the final count
+            if done >= total or now - last_write[0] >= 0.5:
+                last_write[0] = now
+                self.store.update(job_id, done=done, total=total)
+
+        return progress
+
+    def _run(self, job_id: str, fn: Callable, args):
+        if job_id in self._cancelled:
+            self.store.update(job_id, status="cancelled")
+            return
+        self.store.update(job_id, status="running")
+        try:
+            result = dict(fn(self._progress_callback(job_id), *args) or {})
+            total = self.store.get(job_id)["total"]
+            self.store.update(
+                job_id,
+                status="done",
+                done=total,
+                result_path=result.pop("path", None),
+                download_name=result.pop("download_name", None),
+                mimetype=result.pop("mimetype", None),
+                result=json.dumps(result, default=str),
+            )
+        except JobCancelled:
+            self.store.update(job_id, status="cancelled")
+        except Exception as e:
+            traceback.print_exc()
+            self.store.update(job_id, status="failed", error=str(e))
+        finally:
+            self._cancelled.discard(job_id)
+
+
+job_queue = JobQueue(JobStore(JOBS_DB_PATH), JOB_WORKERS)
+
+
+def wants_async(req) -> bool:
+    """Opt-in flag: ?async=1, form field async=1 or JSON {"async": true}."""
+    flag = req.args.get("async") or req.form.get("async")
+    if flag is None and req.is_json:
+        flag = (req.get_json(silent=True) or {}).get("async")
+    return str(flag).lower() in ("1", "true", "yes")
@@ -0,0 +1,128 @@
+# backend/app/services/json_rows.py
+import hashlib, json, os, threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional: faster serializer, the stdlib json is used without it
+    orjson = None
+
+# Serialized responses kept per snapshot (one per offset/limit/fields combination)
+BODY_CACHE_SIZE = 32
+# (offset, limit, fields) of a request without paging or projection
+FULL_RESPONSE = (0, None, None)
+
+
+def dumps(payload) -> bytes:
+    """Compact JSON with sorted keys, like Flask's jsonify; orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+class RowsSnapshot:
+    """The rows of one version of a JSON file, with its validators and the responses built from it."""
+
+    def __init__(self, rows: List[Dict[str, Any]], stamp: Tuple[int, int], etag: str):
+        self.rows = rows
+        self.stamp = stamp
+        self.etag = etag
+        self.last_modified = datetime.fromtimestamp(stamp[0] / 1e9, tz=timezone.utc)
+        self._bodies: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def variant_etag(self, key: tuple) -> str:
+        """
+        Strong ETag of one response built from this version. key is the
+        normalized query; the full, unfiltered response keeps the file's ETag.
+        """
+        if key == FULL_RESPONSE:
+            return self.etag
+        return hashlib.sha1(f"{self.etag}:{key!r}".encode("utf-8")).hexdigest()
+
+    def body(self, key: tuple, build: Callable[[], Any]) -> bytes:
+        """Serialized build() for this version, memoized under key."""
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+                return body
+        body = dumps(build())
+        with self._lock:
+            self._bodies[key] = body
+            while len(self._bodies) > BODY_CACHE_SIZE:
+                self._bodies.popitem(last=False)
+        return body
+
+
+class JsonRowsCache:
+    """
+    In-memory copies of JSON row files (the uploaded_data.json behind
+    /immersion/data). A file is parsed once per version: every load() costs
+    one stat, and a new mtime or size, or a write() through this cache,
+    brings in the new contents.
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[str, RowsSnapshot] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(path: str) -> Tuple[int, int]:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def load(self, path: str) -> RowsSnapshot | None:
+        """Current rows of path, or None when the file does not exist."""
+        path = os.path.abspath(path)
+        try:
+            stamp = self._stamp(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            return None
+        with self._lock:
+            snapshot = self._snapshots.get(path)
+        if snapshot is not None and snapshot.stamp == stamp:
+            return snapshot
+
+        with open(path, "rb") as f:
+            data = f.read()
+        # Stamp from before the read: a write that lands meanwhile shows up as a change next time.
+        # The ETag comes from the contents, so it is the same in every worker process.
+        snapshot = RowsSnapshot(json.loads(data.decode("utf-8")), stamp, hashlib.sha1(data).hexdigest())
+        with self._lock:
+            self._snapshots[path] = snapshot
+        return snapshot
+
+    def write(self, path: str, rows: Iterable[Dict[str, Any]]):
+        """
+        Replace path with rows in one step, so readers never see a half-written
+        file. Rows are written one at a time, so any iterable will do; the text
+        is the same as json.dump(list(rows), f, indent=2).
+        """
+        path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                empty = True
+                for row in rows:
+                    f.write("[\n  " if empty else ",\n  ")
+                    f.write(json.dumps(row, indent=2).replace("\n", "\n  "))
+                    empty = False
+                f.write("[]" if empty else "\n]")
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.invalidate(path)
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._snapshots.pop(os.path.abspath(path), None)
+
+
+json_rows = JsonRowsCache()
@@ -0,0 +1,62 @@
+# backend/app/services/merged_cells.py
+import threading, weakref
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+from openpyxl.worksheet.cell_range import CellRange
+
+
+class MergedCellIndex:
+    """
+    Merged ranges of a sheet bucketed by row, so "which range covers this cell"
+    is a dict lookup plus a bisect over that row's (few) ranges instead of a
+    scan over every merged range.
+    """
+
+    def __init__(self, ranges: Iterable[CellRange]):
+        buckets: Dict[int, List[Tuple[int, int, Tuple[int, int]]]] = {}
+        for rng in ranges:
+            anchor = (rng.min_row, rng.min_col)
+            for row in range(rng.min_row, rng.max_row + 1):
+                buckets.setdefault(row, []).append((rng.min_col, rng.max_col, anchor))
+        # Merged ranges never overlap, so each row's spans sort cleanly by first column
+        self._rows = {row: sorted(spans) for row, spans in buckets.items()}
+        self._starts = {row: [span[0] for span in spans] for row, spans in self._rows.items()}
+
+    @classmethod
+    def from_worksheet(cls, ws) -> "MergedCellIndex":
+        return cls(ws.merged_cells.ranges)
+
+    def anchor(self, row: int, col: int) -> Tuple[int, int] | None:
+        """Top-left (row, col) of the merged range containing the cell, or None."""
+        spans = self._rows.get(row)
+        if not spans:
+            return None
+        i = bisect_right(self._starts[row], col) - 1
+        if i >= 0 and col <= spans[i][1]:
+            return spans[i][2]
+        return None
+
+    def is_top_left(self, row: int, col: int) -> bool:
+        """True for unmerged cells and merged-range anchors, i.e. cells that accept values."""
+        anchor = self.anchor(row, col)
+        return anchor is None or anchor == (row, col)
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def merged_index_for(ws) -> MergedCellIndex:
+    """
+    MergedCellIndex of a worksheet, kept while the sheet is alive and rebuilt
+    when its number of merged ranges changes (a merge or unmerge since).
+    """
+    count = len(ws.merged_cells.ranges)
+    with _lock:
+        entry = _indexes.get(ws)
+    if entry is None or entry[0] != count:
+        entry = (count, MergedCellIndex.from_worksheet(ws))
+        with _lock:
+            _indexes[ws] = entry
+    return entry[1]
@@ -0,0 +1,118 @@
+# backend/app/services/output_cache.py
+import hashlib, json, os, shutil, threading
+from datetime import datetime
+from typing import Any, Dict
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+OUTPUT_CACHE_DIR = os.getenv("OUTPUT_CACHE_DIR", os.path.join(BASE_DIR, "static", "cache", "outputs"))
+OUTPUT_CACHE_MAX_MB = int(os.getenv("OUTPUT_CACHE_MAX_MB", "512"))
+
+
+class OutputCache:
+    """
+    Content-addressed store for generated artifacts.
+
+    Keys hash the template bytes, the template type and the normalized request
+    payload. Entries are plain files ({key}.bin + {key}.json) so the cache
+    survives restarts; the least recently used ones are evicted once the
+    directory grows past max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # abspath -> ((mtime, size), digest); read and replaced under _lock
+        self._template_digests: Dict[str, tuple] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    # ---- keys ----
+    def template_digest(self, template_path: str) -> str:
+        path = os.path.abspath(template_path)
+        stamp = (os.path.getmtime(path), os.path.getsize(path))
+        with self._lock:
+            entry = self._template_digests.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        # Hashed outside the lock; two threads may both hash a changed file, and either result is right
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with self._lock:
+            self._template_digests[path] = (stamp, digest)
+        return digest
+
+    def key(self, template_path: str, template_type: str, payload: Any) -> str:
+        h = hashlib.sha256()
+        h.update(self.template_digest(template_path).encode())
+        h.update(b"\0" + template_type.encode() + b"\0")
+        if isinstance(payload, (bytes, bytearray)):
+            h.update(payload)
+        else:
+            h.update(json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    # ---- entries ----
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + ".bin", base + ".json"
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        """Return {"path", "filename", ...} for a cached artifact and mark it recently used."""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(data_path)
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        meta["path"] = data_path
+        return meta
+
+    def put(self, key: str, filename: str, data: bytes | None = None, source_path: str | None = None,
+            fileobj=None) -> Dict[str, Any]:
+        data_path, meta_path = self._paths(key)
+        tmp_path = f"{data_path}.{threading.get_ident()}.tmp"
+        if source_path is not None:
+            shutil.copyfile(source_path, tmp_path)
+        elif fileobj is not None:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(fileobj, f)
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        os.replace(tmp_path, data_path)
+
+        meta = {"filename": filename, "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        self._evict()
+        return {**meta, "path": data_path}
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if not name.endswith(".bin"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            entries.sort()
+            while total > self.max_bytes and len(entries) > 1:
+                _, size, path = entries.pop(0)
+                for p in (path, path[:-len(".bin")] + ".json"):
+                    if os.path.exists(p):
+                        os.remove(p)
+                total -= size
+
+
+output_cache = OutputCache(OUTPUT_CACHE_DIR, OUTPUT_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,71 @@
+# backend/app/services/placeholders.py
+import re
+from bisect import bisect_right
+from typing import Any, Mapping, Optional, Pattern
+
+# {key} in the certificate templates, {{ key }} in ad-hoc templates posted to run.py
+BRACE_RE = re.compile(r"\{([^{}]+)\}")
+DOUBLE_BRACE_RE = re.compile(r"\{\{\s*([^{}]+?)\s*\}\}")
+
+
+def _resolve(match, row: Mapping[str, Any], default: Optional[str]) -> str:
+    key = match.group(1)
+    if key in row:
+        return str(row[key])
+    # Unknown keys are left in place unless the caller asks for a default
+    return match.group(0) if default is None else default
+
+
+def substitute(text: str, row: Mapping[str, Any], pattern: Pattern = BRACE_RE, default: Optional[str] = None) -> str:
+    """Resolve every placeholder in a plain string in a single regex pass."""
+    return pattern.sub(lambda m: _resolve(m, row, default), text)
+
+
+def fill_paragraph(paragraph, row: Mapping[str, Any], pattern: Pattern = BRACE_RE, default: Optional[str] = None) -> bool:
+    """
+    Substitute placeholders in a python-pptx paragraph in one pass over its joined text.
+
+    A token inside one run is replaced in place. A token split across runs
+    (e.g. '{Hours' + '}') is written into the run where it starts, and the
+    runs it spans are trimmed. Runs without placeholders are not touched, so
+    their formatting is kept. Returns True if any run changed.
+    """
+    runs = paragraph.runs
+    texts = [run.text for run in runs]
+    full_text = ''.join(texts)
+    if '{' not in full_text:
+        return False
+
+    matches = list(pattern.finditer(full_text))
+    if not matches:
+        return False
+
+    offsets = []
+    pos = 0
+    for t in texts:
+        offsets.append(pos)
+        pos += len(t)
+
+    # Right to left, so offsets of earlier tokens stay valid while runs are rewritten
+    for m in reversed(matches):
+        value = _resolve(m, row, default)
+        if value == m.group(0):
+            continue
+        first = bisect_right(offsets, m.start()) - 1
+        last = bisect_right(offsets, m.end() - 1) - 1
+        head = m.start() - offsets[first]
+        tail = m.end() - offsets[last]
+        if first == last:
+            texts[first] = texts[first][:head] + value + texts[first][tail:]
+        else:
+            texts[last] = texts[last][tail:]
+            for i in range(first + 1, last):
+                texts[i] = ""
+            texts[first] = texts[first][:head] + value
+
+    changed = False
+    for run, text in zip(runs, texts):
+        if run.text != text:
+            run.text = text
+            changed = True
+    return changed
@@ -0,0 +1,170 @@
+# backend/app/services/pptx_fastpath.py
+import io, re, threading, zipfile
+from typing import Any, Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from app.services.placeholders import fill_paragraph
+from app.services.pptx_templates import APP_PROPERTIES, CompiledTemplate, with_slide_count
+
+NS_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_CT = "http://schemas.openxmlformats.org/package/2006/content-types"
+NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+RT_SLIDE = NS_R + "/slide"
+RT_SLIDE_LAYOUT = NS_R + "/slideLayout"
+CT_SLIDE = "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+
+PRESENTATION = "ppt/presentation.xml"
+PRESENTATION_RELS = "ppt/_rels/presentation.xml.rels"
+CONTENT_TYPES = "[Content_Types].xml"
+
+# Private-use markers standing in for placeholders in the serialized slide XML
+_MARK_RE = re.compile(r"\ue000(\d+)\ue001")
+
+
+class FastPathUnsupported(Exception):
+    """The template uses something the direct-XML writer does not reproduce."""
+
+
+class XmlSlideTemplate:
+    """
+    The template's only slide serialized once and split around its placeholders.
+
+    Placeholders are normalized with fill_paragraph first, so tokens split across
+    runs end up in the same runs the object-model path would write them to.
+    """
+
+    def __init__(self, template: CompiledTemplate):
+        with zipfile.ZipFile(io.BytesIO(template.blob)) as src:
+            self.parts = {name: src.read(name) for name in src.namelist()}
+
+        slide_part, slide_rels_part = self._single_slide()
+        rels = etree.fromstring(self.parts[slide_rels_part])
+        for rel in rels:
+            if rel.get("Type") != RT_SLIDE_LAYOUT or rel.get("TargetMode") == "External":
+                raise FastPathUnsupported(f"slide relationship {rel.get('Type')}")
+
+        prs = template.open()
+        slide = prs.slides[0]
+        keys = sorted(template.keys)
+        markers = {key: f"\ue000{i}\ue001" for i, key in enumerate(keys)}
+        for shape in slide.shapes:
+            if shape.has_text_frame:
+                for paragraph in shape.text_frame.paragraphs:
+                    fill_paragraph(paragraph, markers)
+
+        xml = etree.tostring(slide._element, xml_declaration=True, encoding="UTF-8", standalone=True).decode("utf-8")
+        pieces = _MARK_RE.split(xml)
+        self.chunks = pieces[0::2]
+        self.keys = [keys[int(i)] for i in pieces[1::2]]
+
+        self.slide_part = slide_part
+        self.slide_rels_part = slide_rels_part
+        self.slide_rels = self.parts[slide_rels_part]
+
+    def _single_slide(self) -> Tuple[str, str]:
+        if not all(p in self.parts for p in (PRESENTATION, PRESENTATION_RELS, CONTENT_TYPES)):
+            raise FastPathUnsupported("missing presentation parts")
+        prs = etree.fromstring(self.parts[PRESENTATION])
+        sld_ids = prs.findall(f"{{{NS_P}}}sldIdLst/{{{NS_P}}}sldId")
+        if len(sld_ids) != 1:
+            raise FastPathUnsupported("template must have exactly one slide")
+        rid = sld_ids[0].get(f"{{{NS_R}}}id")
+
+        rels = etree.fromstring(self.parts[PRESENTATION_RELS])
+        target = next((r.get("Target") for r in rels if r.get("Id") == rid), None)
+        if not target or not target.startswith("slides/"):
+            raise FastPathUnsupported("unexpected slide location")
+        slide_part = "ppt/" + target
+        folder, name = slide_part.rsplit("/", 1)
+        slide_rels_part = f"{folder}/_rels/{name}.rels"
+        if slide_rels_part not in self.parts:
+            raise FastPathUnsupported("slide has no relationships part")
+        return slide_part, slide_rels_part
+
+    def render(self, row: Dict[str, Any]) -> bytes:
+        out = [self.chunks[0]]
+        for key, chunk in zip(self.keys, self.chunks[1:]):
+            value = str(row[key]) if key in row else "{" + key + "}"
+            out.append(escape(value))
+            out.append(chunk)
+        return "".join(out).encode("utf-8")
+
+    # ---- package bookkeeping ----
+
+    def _presentation_xml(self, count: int) -> bytes:
+        root = etree.fromstring(self.parts[PRESENTATION])
+        sld_id_lst = root.find(f"{{{NS_P}}}sldIdLst")
+        for el in list(sld_id_lst):
+            sld_id_lst.remove(el)
+        for i in range(1, count + 1):
+            el = etree.SubElement(sld_id_lst, f"{{{NS_P}}}sldId")
+            el.set("id", str(255 + i))
+            el.set(f"{{{NS_R}}}id", f"rIdSlide{i}")
+        return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    def _presentation_rels(self, count: int) -> bytes:
+        root = etree.fromstring(self.parts[PRESENTATION_RELS])
+        for rel in list(root):
+            if rel.get("Type") == RT_SLIDE:
+                root.remove(rel)
+        for i in range(1, count + 1):
+            etree.SubElement(root, f"{{{NS_REL}}}Relationship",
+                             Id=f"rIdSlide{i}", Type=RT_SLIDE, Target=f"slides/slide{i}.xml")
+        return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    def _content_types(self, count: int) -> bytes:
+        root = etree.fromstring(self.parts[CONTENT_TYPES])
+        for el in list(root):
+            if el.get("ContentType") == CT_SLIDE:
+                root.remove(el)
+        for i in range(1, count + 1):
+            etree.SubElement(root, f"{{{NS_CT}}}Override",
+                             PartName=f"/ppt/slides/slide{i}.xml", ContentType=CT_SLIDE)
+        return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    def write_deck(self, rows: List[Dict[str, Any]], fileobj, progress=None):
+        """Write a deck with one slide per row, straight into a new package."""
+        count = len(rows)
+        skip = {PRESENTATION, PRESENTATION_RELS, CONTENT_TYPES, self.slide_part, self.slide_rels_part}
+
+        with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(CONTENT_TYPES, self._content_types(count))
+            zf.writestr(PRESENTATION, self._presentation_xml(count))
+            zf.writestr(PRESENTATION_RELS, self._presentation_rels(count))
+            for name, data in self.parts.items():
+                if name in skip:
+                    continue
+                if name == APP_PROPERTIES:
+                    data = with_slide_count(data, count)
+                zf.writestr(name, data)
+            for i, row in enumerate(rows, start=1):
+                zf.writestr(f"ppt/slides/slide{i}.xml", self.render(row))
+                zf.writestr(f"ppt/slides/_rels/slide{i}.xml.rels", self.slide_rels)
+                if progress:
+                    progress(i, count)
+
+
+_compiled: Dict[Tuple[str, float], XmlSlideTemplate | FastPathUnsupported] = {}
+_lock = threading.Lock()
+
+
+def get_xml_template(template: CompiledTemplate) -> XmlSlideTemplate:
+    """Compile (once per template version) or raise FastPathUnsupported."""
+    key = (template.path, template.mtime)
+    with _lock:
+        entry = _compiled.get(key)
+    if entry is None:
+        try:
+            entry = XmlSlideTemplate(template)
+        except FastPathUnsupported as e:
+            entry = e
+        with _lock:
+            for stale in [k for k in _compiled if k[0] == template.path and k != key]:
+                del _compiled[stale]
+            _compiled[key] = entry
+    if isinstance(entry, FastPathUnsupported):
+        raise entry
+    return entry
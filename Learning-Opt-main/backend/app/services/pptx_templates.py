@@ -0,0 +1,106 @@
+# backend/app/services/pptx_templates.py
+import io, os, threading
+from collections import OrderedDict
+from copy import deepcopy
+from typing import List, Tuple
+
+from lxml import etree
+from pptx import Presentation
+
+from app.services.placeholders import BRACE_RE
+
+# (shape index, paragraph index, placeholder keys found in that paragraph)
+PlaceholderLocation = Tuple[int, int, Tuple[str, ...]]
+
+APP_PROPERTIES = "docProps/app.xml"
+_NS_EXTENDED = "http://schemas.openxmlformats.org/officeDocument/2006/extended-properties"
+
+
+def with_slide_count(app_xml: bytes, count: int) -> bytes:
+    """docProps/app.xml with its <Slides> statistic set to count, for packages written part by part."""
+    root = etree.fromstring(app_xml)
+    slides = root.find(f"{{{_NS_EXTENDED}}}Slides")
+    if slides is None:
+        return app_xml
+    slides.text = str(count)
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+class CompiledTemplate:
+    """A .pptx template parsed once: raw bytes, first-slide shapes and placeholder locations."""
+
+    def __init__(self, path: str, mtime: float, blob: bytes):
+        self.path = path
+        self.mtime = mtime
+        self.blob = blob
+
+        prs = self.open()
+        if not prs.slides:
+            raise RuntimeError(f"Template has no slides: {path}")
+        slide = prs.slides[0]
+        self.elements = [deepcopy(shape.element) for shape in slide.shapes]
+        self.placeholders = self._index_placeholders(slide)
+        self.keys = frozenset(k for _, _, keys in self.placeholders for k in keys)
+        # Joined run text of every first-slide paragraph, for text-only previews
+        self.paragraph_texts = [
+            ''.join(run.text for run in paragraph.runs)
+            for shape in slide.shapes if shape.has_text_frame
+            for paragraph in shape.text_frame.paragraphs
+        ]
+
+    def open(self):
+        """Return a fresh, private Presentation built from the cached bytes."""
+        return Presentation(io.BytesIO(self.blob))
+
+    @staticmethod
+    def _index_placeholders(slide) -> List[PlaceholderLocation]:
+        locations = []
+        for shape_idx, shape in enumerate(slide.shapes):
+            if not shape.has_text_frame:
+                continue
+            for para_idx, paragraph in enumerate(shape.text_frame.paragraphs):
+                text = ''.join(run.text for run in paragraph.runs)
+                keys = tuple(dict.fromkeys(BRACE_RE.findall(text)))
+                if keys:
+                    locations.append((shape_idx, para_idx, keys))
+        return locations
+
+
+class TemplateCache:
+    """LRU of CompiledTemplate keyed by (absolute path, mtime); a touched file is re-parsed."""
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, float], CompiledTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> CompiledTemplate:
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        key = (path, mtime)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        with open(path, "rb") as f:
+            entry = CompiledTemplate(path, mtime, f.read())
+
+        with self._lock:
+            # Drop stale versions of the same file before inserting the new one
+            for stale in [k for k in self._entries if k[0] == path and k != key]:
+                del self._entries[stale]
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+template_cache = TemplateCache(maxsize=int(os.getenv("PPTX_TEMPLATE_CACHE_SIZE", "8")))
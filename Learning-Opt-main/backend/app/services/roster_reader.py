@@ -0,0 +1,151 @@
+# backend/app/services/roster_reader.py
+import csv, io, re
+from itertools import chain, islice
+from typing import Iterator, Tuple
+
+from openpyxl import load_workbook
+
+# Uploaded rosters: SCHOOL in F1, BATCH in G1, one student per row from row 10 (columns A-T)
+SCHOOL_COL, BATCH_COL = 6, 7
+FIRST_STUDENT_ROW = 10
+ROSTER_WIDTH = 20
+# Columns A-T by name, as in the header row of a CSV export
+ROSTER_COLUMNS = ("last_name", "first_name", "middle_name", "strand", "department",
+                  "wi", "co", "5s", "bo", "cbo", "sdg",
+                  "ohsa", "we", "ujc", "iso", "po", "hr", "perdev", "supp", "ds")
+
+_INT_RE = re.compile(r"-?\d+")
+_FLOAT_RE = re.compile(r"-?(\d+\.\d*|\.\d+)")
+
+
+class RosterReader:
+    """
+    An uploaded roster opened in openpyxl's read-only mode.
+
+    Only F1/G1 are read up front; student rows are parsed lazily as value
+    tuples, so memory stays flat however long the sheet is. Rows come out
+    as a full load's iter_rows(min_row=10, values_only=True) would give
+    them, blank ones included, padded to at least min_width values.
+    """
+
+    def __init__(self, source, first_row: int = FIRST_STUDENT_ROW, min_width: int = 0):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        self.wb = load_workbook(source, read_only=True, data_only=True)
+        self.ws = self.wb.active
+        self.first_row = first_row
+        self.min_width = min_width
+
+        header = next(self.ws.iter_rows(min_row=1, max_row=1, max_col=BATCH_COL, values_only=True), ())
+        header = tuple(header) + (None,) * (BATCH_COL - len(header))
+        self.school = str(header[SCHOOL_COL - 1] or "").strip()
+        self.batch = str(header[BATCH_COL - 1] or "").strip()
+
+    def rows(self) -> Iterator[Tuple]:
+        """Value tuples of every row from first_row down; the file is closed once they run out."""
+        try:
+            if self.ws.max_row is not None and self.ws.max_row < self.first_row:
+                return
+            for row in self.ws.iter_rows(min_row=self.first_row, values_only=True):
+                # Files without a <dimension> give ragged rows; pad them to the columns the caller reads
+                if len(row) < self.min_width:
+                    row += (None,) * (self.min_width - len(row))
+                yield row
+        finally:
+            self.close()
+
+    def close(self):
+        self.wb.close()
+
+    def __enter__(self) -> "RosterReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _csv_value(text: str):
+    """A CSV field typed the way openpyxl returns the cell: blank -> None, plain numbers -> int/float."""
+    if not text:
+        return None
+    if _INT_RE.fullmatch(text):
+        return int(text)
+    if _FLOAT_RE.fullmatch(text):
+        return float(text)
+    return text
+
+
+class RosterCsvReader:
+    """
+    A roster uploaded as CSV, with the same interface as RosterReader.
+
+    Two layouts are accepted: the roster sheet saved as CSV (SCHOOL/BATCH in
+    F1/G1, students from line 10), or an export with a header row naming the
+    ROSTER_COLUMNS plus optional school/batch columns. Lines are parsed as
+    they are read, so the file is never held in memory.
+    """
+
+    def __init__(self, source, first_row: int = FIRST_STUDENT_ROW, min_width: int = 0):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        self.text = io.TextIOWrapper(source, encoding="utf-8-sig", errors="replace", newline="")
+        self.min_width = min_width
+        self._lines = csv.reader(self.text)
+        first = next(self._lines, [])
+
+        if first and first[0].strip().lower() == "last_name":
+            header = [h.strip().lower() for h in first]
+            self._columns = [header.index(c) if c in header else None for c in ROSTER_COLUMNS]
+            head = next(self._lines, None)
+            if head is not None:
+                self._lines = chain([head], self._lines)
+            self.school = self._field(head, header, "school")
+            self.batch = self._field(head, header, "batch")
+        else:
+            self._columns = None
+            first += [""] * (BATCH_COL - len(first))
+            self.school = first[SCHOOL_COL - 1].strip()
+            self.batch = first[BATCH_COL - 1].strip()
+            # Lines 2 .. first_row-1 are the sheet's title and header rows
+            self._lines = islice(self._lines, max(first_row - 2, 0), None)
+
+    @staticmethod
+    def _field(line, header, name) -> str:
+        if line is None or name not in header or header.index(name) >= len(line):
+            return ""
+        return line[header.index(name)].strip()
+
+    def rows(self) -> Iterator[Tuple]:
+        """Value tuples in column order A-T (padded to min_width); the file is closed once they run out."""
+        try:
+            for line in self._lines:
+                if self._columns is not None:
+                    line = [line[i] if i is not None and i < len(line) else "" for i in self._columns]
+                row = tuple(_csv_value(v) for v in line)
+                if len(row) < self.min_width:
+                    row += (None,) * (self.min_width - len(row))
+                yield row
+        finally:
+            self.close()
+
+    def close(self):
+        # Leave the caller's stream open; only stop reading through the wrapper
+        if self.text is not None:
+            self.text.detach()
+            self.text = None
+
+    def __enter__(self) -> "RosterCsvReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def is_csv(filename: str | None) -> bool:
+    return bool(filename) and filename.lower().endswith(".csv")
+
+
+def open_roster(source, filename: str | None = None, min_width: int = 0):
+    """RosterCsvReader for a .csv upload, RosterReader (xlsx) for anything else."""
+    reader = RosterCsvReader if is_csv(filename) else RosterReader
+    return reader(source, min_width=min_width)
@@ -0,0 +1,97 @@
+# backend/app/services/sheet_placeholders.py
+import os, re, threading
+from typing import Any, Dict, List, Tuple
+
+from openpyxl.worksheet.worksheet import Worksheet
+
+PLACEHOLDER_RE = re.compile(r"\{([^}]+)\}")
+
+
+def cell_context(text: str) -> str | None:
+    """Which YEAR LAST ATTENDED column a cell refers to, used to pick a per-context mapping."""
+    up = text.upper()
+    if "YEAR LAST ATTENDED" in up:
+        if "ELEMENTARY" in up: return "ELEMENTARY"
+        if "SECONDARY" in up: return "SECONDARY"
+        if "TERTIARY" in up: return "TERTIARY"
+    return None
+
+
+def resolve_column(mapping: Dict[str, Any], key: str, context: str | None):
+    mp = mapping.get(key, key)
+    return (mp.get(context) or mp.get("DEFAULT")) if isinstance(mp, dict) else mp
+
+
+class PlaceholderIndex:
+    """
+    The placeholder cells of a template sheet, found with one scan.
+
+    Each entry keeps the cell position, its text split around the {KEY}
+    tokens and its YEAR LAST ATTENDED context, so filling a copy of the
+    sheet only touches those cells and never re-parses their text.
+    """
+
+    def __init__(self, cells: List[Tuple[int, int, List[str], str | None]]):
+        self.cells = cells
+
+    @classmethod
+    def from_cells(cls, cells) -> "PlaceholderIndex":
+        """Build from (row, col, value) triples."""
+        index = []
+        for r, c, text in cells:
+            if isinstance(text, str) and "{" in text and "}" in text:
+                parts = PLACEHOLDER_RE.split(text)
+                if len(parts) > 1:
+                    index.append((r, c, parts, cell_context(text)))
+        return cls(index)
+
+    @classmethod
+    def from_worksheet(cls, ws: Worksheet) -> "PlaceholderIndex":
+        return cls.from_cells(
+            (cell.row, cell.column, cell.value)
+            for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=ws.max_column)
+            for cell in row
+        )
+
+    @property
+    def keys(self) -> frozenset:
+        return frozenset(k for _, _, parts, _ in self.cells for k in parts[1::2])
+
+    def bind(self, mapping: Dict[str, Any]):
+        """Resolve every token to its data column once per mapping: [(row, col, parts, columns)]."""
+        return [
+            (r, c, parts, [resolve_column(mapping, key, context) for key in parts[1::2]])
+            for r, c, parts, context in self.cells
+        ]
+
+    def values(self, mapping: Dict[str, Any], rowdict: Dict[str, Any], bound=None) -> Dict[Tuple[int, int], str]:
+        """{(row, col): filled text} for every placeholder cell."""
+        out = {}
+        for r, c, parts, columns in (bound if bound is not None else self.bind(mapping)):
+            text = list(parts)
+            for i, col in enumerate(columns):
+                val = rowdict.get(col, "")
+                text[2 * i + 1] = "" if val is None else str(val)
+            out[(r, c)] = "".join(text)
+        return out
+
+    def fill(self, ws: Worksheet, mapping: Dict[str, Any], rowdict: Dict[str, Any], bound=None):
+        for (r, c), text in self.values(mapping, rowdict, bound).items():
+            ws.cell(row=r, column=c).value = text
+
+
+_indexes: Dict[Tuple[str, str], Tuple[float, PlaceholderIndex]] = {}
+_lock = threading.Lock()
+
+
+def placeholder_index_for(template_path: str, ws: Worksheet) -> PlaceholderIndex:
+    """PlaceholderIndex for a sheet of a template file, rebuilt when the file changes."""
+    path = os.path.abspath(template_path)
+    mtime = os.path.getmtime(path)
+    with _lock:
+        entry = _indexes.get((path, ws.title))
+    if entry is None or entry[0] != mtime:
+        entry = (mtime, PlaceholderIndex.from_worksheet(ws))
+        with _lock:
+            _indexes[(path, ws.title)] = entry
+    return entry[1]
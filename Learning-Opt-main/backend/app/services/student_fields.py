@@ -0,0 +1,103 @@
+# backend/app/services/student_fields.py
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Nested dicts searched when a field is not a top-level key
+PARENT_KEYS = ("scores", "grades", "appraisal", "performance")
+
+_MISSING = object()
+
+
+def key_shape(student: Dict[str, Any]) -> tuple:
+    """Hashable layout of a student dict: its keys, plus the layout of any nested score dicts."""
+    return tuple(
+        (k, key_shape(v) if k in PARENT_KEYS and isinstance(v, dict) else None)
+        for k, v in student.items()
+    )
+
+
+def _compile(shape: tuple, nk: str):
+    """
+    Plan for finding normalized field nk in dicts of this shape, in get_student_value's order:
+    exact (case/whitespace-insensitive) key, then the nested dicts, then a substring match.
+    """
+    keys = [k for k, _ in shape]
+    exact = next((k for k in keys if isinstance(k, str) and k.strip().lower() == nk), _MISSING)
+    if exact is not _MISSING:
+        return exact, (), _MISSING
+    subs = dict(shape)
+    nested = tuple((p, _compile(subs[p], nk)) for p in PARENT_KEYS if subs.get(p) is not None)
+    fallback = next((k for k in keys if isinstance(k, str) and nk in k.strip().lower()), _MISSING)
+    return _MISSING, nested, fallback
+
+
+def _run(plan, student: Dict[str, Any]):
+    exact, nested, fallback = plan
+    if exact is not _MISSING:
+        return student[exact]
+    for parent, sub in nested:
+        val = _run(sub, student[parent])
+        if val is not None:
+            return val
+    if fallback is not _MISSING:
+        return student[fallback]
+    return None
+
+
+class StudentFields:
+    """
+    Resolves a fixed set of field names against student dicts.
+
+    Lookup plans are compiled once per distinct key layout (kept in a small
+    LRU), so a roster where every row has the same columns pays for the fuzzy
+    key matching once and then does direct dict reads per student.
+    """
+
+    def __init__(self, fields: Iterable[str] = (), maxsize: int = 256):
+        self.fields = list(dict.fromkeys(fields))
+        self.maxsize = maxsize
+        self._plans: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _plans_for(self, student: Dict[str, Any]) -> Tuple[tuple, Dict[str, Any]]:
+        shape = key_shape(student)
+        with self._lock:
+            plans = self._plans.get(shape)
+            if plans is not None:
+                self._plans.move_to_end(shape)
+                return shape, plans
+        plans = {field: _compile(shape, field.strip().lower()) for field in self.fields}
+        with self._lock:
+            self._plans[shape] = plans
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+        return shape, plans
+
+    def record(self, student) -> Dict[str, Any]:
+        """Flat {field: value} for one student; fields that cannot be found are None."""
+        if not isinstance(student, dict):
+            return dict.fromkeys(self.fields)
+        _, plans = self._plans_for(student)
+        return {field: _run(plans[field], student) for field in self.fields}
+
+    def records(self, students: Iterable[Any]) -> List[Dict[str, Any]]:
+        return [self.record(s) for s in students]
+
+    def get(self, student, field: str):
+        """One field with get_student_value semantics; plans for extra fields are cached too."""
+        if not isinstance(student, dict):
+            return None
+        shape, plans = self._plans_for(student)
+        plan = plans.get(field)
+        if plan is None:
+            plan = plans[field] = _compile(shape, field.strip().lower())
+        return _run(plan, student)
+
+
+_default = StudentFields()
+
+
+def student_value(student, key: str):
+    """Drop-in for get_student_value backed by the shared plan cache."""
+    return _default.get(student, key)
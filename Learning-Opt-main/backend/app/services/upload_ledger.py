@@ -0,0 +1,84 @@
+# backend/app/services/upload_ledger.py
+import hashlib, json, logging, threading
+from contextlib import contextmanager
+from typing import Any, Dict
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+UPSERT_UPLOAD_SQL = """
+    INSERT INTO uploads (content_hash, kind, school, batch, row_count, result)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE school = VALUES(school), batch = VALUES(batch),
+        row_count = VALUES(row_count), result = VALUES(result), created_at = CURRENT_TIMESTAMP
+"""
+
+
+def content_hash(stream) -> str:
+    """sha256 of an uploaded file's bytes; the stream is rewound afterwards."""
+    stream.seek(0)
+    h = hashlib.sha256()
+    for block in iter(lambda: stream.read(1 << 20), b""):
+        h.update(block)
+    stream.seek(0)
+    return h.hexdigest()
+
+
+def wants_force(req) -> bool:
+    """Opt-in flag to reprocess a file that was already ingested: ?force=1 or form field force=1."""
+    flag = req.args.get("force") or req.form.get("force")
+    return str(flag).lower() in ("1", "true", "yes")
+
+
+class UploadLedger:
+    """
+    The uploads table: one row per (file content hash, route) with the
+    response that upload produced, so a repeat upload is answered without
+    parsing the workbook or touching immersion_records again.
+
+    Only uploads whose every row was stored are recorded. The ledger is best
+    effort: if it cannot be read or written the upload is simply processed
+    as usual.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._claims: Dict[tuple, list] = {}
+
+    @contextmanager
+    def claim(self, digest: str, kind: str):
+        """Serialize work on one file, so a double submit waits for the first and then finds its result."""
+        key = (digest, kind)
+        with self._lock:
+            entry = self._claims.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._claims[key]
+
+    def lookup(self, digest: str, kind: str) -> Dict[str, Any] | None:
+        try:
+            row = config.fetch_one("SELECT result FROM uploads WHERE content_hash=%s AND kind=%s", (digest, kind))
+        except Exception as e:
+            logger.warning("Upload ledger lookup failed: %s", e)
+            return None
+        return json.loads(row["result"]) if row else None
+
+    def record(self, digest: str, kind: str, school: str, batch: str, row_count: int, result: Dict[str, Any]):
+        """Store an upload's result; one with failed rows is not stored, so retrying it processes it again."""
+        if result.get("failed"):
+            return
+        try:
+            config.execute_query(UPSERT_UPLOAD_SQL, (digest, kind, school, batch, row_count,
+                                                     json.dumps(result, default=str)))
+        except Exception as e:
+            logger.warning("Upload ledger write failed: %s", e)
+
+
+upload_ledger = UploadLedger()
@@ -0,0 +1,123 @@
+# backend/app/services/workbook_templates.py
+import io, os, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+
+from openpyxl import load_workbook
+from openpyxl.workbook import Workbook
+
+# Parsed copies kept ready per template; 0 keeps only the byte image and parses on checkout
+EXCEL_TEMPLATE_POOL = int(os.getenv("EXCEL_TEMPLATE_POOL", "2"))
+
+Prepare = Callable[[Workbook], None]
+
+
+class WorkbookTemplate:
+    """
+    One .xlsx template at one mtime: its byte image (after the optional
+    prepare step) plus a few parsed copies ready to hand out. Every copy is
+    private to whoever checks it out and is never handed out twice.
+    """
+
+    def __init__(self, path: str, data_only: bool = False, prepare: Prepare | None = None,
+                 pool_size: int = EXCEL_TEMPLATE_POOL):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        self.data_only = data_only
+        self.pool_size = pool_size
+        self._ready: deque = deque()
+        self._lock = threading.Lock()
+        self._refilling = False
+
+        if prepare is None:
+            with open(path, "rb") as f:
+                self.blob = f.read()
+            first = load_workbook(io.BytesIO(self.blob), data_only=data_only)
+        else:
+            wb = load_workbook(path, data_only=data_only)
+            prepare(wb)
+            out = io.BytesIO()
+            wb.save(out)
+            self.blob = out.getvalue()
+            # Copies must round-trip through the saved image, so the prepared original is not pooled
+            first = self.open() if pool_size else None
+        if first is not None and pool_size:
+            self._ready.append(first)
+
+    def open(self) -> Workbook:
+        """A fresh workbook parsed from the byte image."""
+        return load_workbook(io.BytesIO(self.blob), data_only=self.data_only)
+
+    def checkout(self) -> Workbook:
+        """A ready copy when one is pooled (parsing a replacement in the background), else a fresh parse."""
+        with self._lock:
+            wb = self._ready.popleft() if self._ready else None
+        self._schedule_refill()
+        return wb if wb is not None else self.open()
+
+    def _schedule_refill(self):
+        with self._lock:
+            if self._refilling or len(self._ready) >= self.pool_size:
+                return
+            self._refilling = True
+        _refill_pool.submit(self._refill)
+
+    def _refill(self):
+        try:
+            while True:
+                with self._lock:
+                    if len(self._ready) >= self.pool_size:
+                        return
+                wb = self.open()
+                with self._lock:
+                    self._ready.append(wb)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+
+# One background thread parses copies so refills never compete with each other
+_refill_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="workbook-templates")
+
+TemplateKey = Tuple[str, bool, Prepare | None]
+
+
+class WorkbookTemplates:
+    """WorkbookTemplate per (path, data_only, prepare); a file whose mtime changed is reloaded on next use."""
+
+    def __init__(self, pool_size: int = EXCEL_TEMPLATE_POOL):
+        self.pool_size = pool_size
+        self._entries: Dict[TemplateKey, WorkbookTemplate] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[TemplateKey, threading.Lock] = {}
+
+    def get(self, path: str, data_only: bool = False, prepare: Prepare | None = None) -> WorkbookTemplate:
+        key = (os.path.abspath(path), data_only, prepare)
+        mtime = os.path.getmtime(key[0])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime == mtime:
+                return entry
+            loading = self._loading.setdefault(key, threading.Lock())
+        # Concurrent first requests wait for one parse instead of each doing their own
+        with loading:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None or entry.mtime != mtime:
+                entry = WorkbookTemplate(key[0], data_only, prepare, self.pool_size)
+                with self._lock:
+                    self._entries[key] = entry
+        return entry
+
+    def checkout(self, path: str, data_only: bool = False, prepare: Prepare | None = None) -> Workbook:
+        """A private, ready-to-fill copy of the template."""
+        return self.get(path, data_only, prepare).checkout()
+
+    def warm(self, path: str, data_only: bool = False, prepare: Prepare | None = None):
+        """Load a template in the background (e.g. at startup) so the first request finds it ready."""
+        if os.path.exists(path):
+            _refill_pool.submit(self.get, path, data_only, prepare)
+
+
+workbook_templates = WorkbookTemplates()
@@ -0,0 +1,214 @@
+# backend/benchmarks/bench_certificates.py
+"""
+Certificate throughput benchmarks.
+
+Runs fill_slide, /generate/certificates and /generate/preview against the
+templates in uploads/templates with synthetic rosters, and writes rows/sec,
+p50/p99 per-slide latency, peak RSS and output size to a JSON file so two
+runs can be diffed.
+
+    cd backend
+    python -m benchmarks.bench_certificates --sizes 10 1000 --output bench_before.json
+    python -m benchmarks.bench_certificates --compare bench_before.json bench_after.json
+"""
+import argparse, json, os, platform, resource, statistics, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+TEMPLATE_DIR = os.path.join(BACKEND_DIR, "uploads", "templates")
+DEFAULT_SIZES = [10, 1000, 10000]
+DEFAULT_TEMPLATES = ["ojt", "immersion", "tesda"]
+
+
+def synthetic_roster(n, extra_columns=16):
+    """Rows carrying every certificate placeholder plus filler columns, like an SIS export."""
+    rows = []
+    for i in range(n):
+        row = {
+            "Name": f"Juan Dela Cruz {i}",
+            "School": f"Laguna State Polytechnic University {i % 7}",
+            "Hours": str(240 + i % 3 * 120),
+            "Course": "BS Information Technology",
+            "Date": "17th day of October 2026",
+            "Department": ["IT", "PROD", "ACCTG"][i % 3],
+            "Grade Level and Strand": "Grade 12 - STEM",
+        }
+        for c in range(extra_columns):
+            row[f"Extra {c}"] = f"value {i}-{c}"
+        rows.append(row)
+    return rows
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _summary(name, template, size, elapsed, latencies=None, output_bytes=None):
+    result = {
+        "case": name,
+        "template": template,
+        "rows": size,
+        "seconds": round(elapsed, 4),
+        "rows_per_sec": round(size / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "output_bytes": output_bytes,
+    }
+    if latencies:
+        result["p50_ms"] = round(_percentile(latencies, 50) * 1000, 3)
+        result["p99_ms"] = round(_percentile(latencies, 99) * 1000, 3)
+        result["mean_ms"] = round(statistics.fmean(latencies) * 1000, 3)
+    return result
+
+
+# ---- cases (each runs in a fresh process so peak RSS is per case) ----
+
+def bench_fill_slide(template, size, options):
+    from app.services.certificate_decks import _append_slide, fill_slide
+    from app.services.pptx_templates import template_cache
+
+    compiled = template_cache.get(os.path.join(TEMPLATE_DIR, f"{template}.pptx"))
+    prs = compiled.open()
+    layout = prs.slides[0].slide_layout
+    rows = synthetic_roster(size)
+
+    latencies = []
+    start = time.perf_counter()
+    for row in rows:
+        slide = _append_slide(prs, layout, compiled.elements)
+        t0 = time.perf_counter()
+        fill_slide(slide, row, compiled.placeholders)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    return _summary("fill_slide", template, size, elapsed, latencies)
+
+
+def bench_generate_certificates(template, size, options):
+    """Runs the route's render step directly so progress callbacks give per-slide latencies."""
+    from app.routes.generate import OUTPUT_DIR, render_certificate_files
+
+    rows = synthetic_roster(size)
+    template_path = os.path.join(TEMPLATE_DIR, f"{template}.pptx")
+    stamp = f"bench {os.getpid()}"
+
+    latencies = []
+    last = [time.perf_counter(), 0]
+
+    def progress(done, total):
+        now = time.perf_counter()
+        if done > last[1]:
+            per_slide = (now - last[0]) / (done - last[1])
+            latencies.extend([per_slide] * (done - last[1]))
+        last[0], last[1] = now, done
+
+    start = last[0] = time.perf_counter()
+    files = render_certificate_files(options, template, template_path, rows, stamp, progress=progress)
+    elapsed = time.perf_counter() - start
+
+    output_bytes = 0
+    for name in files:
+        path = os.path.join(OUTPUT_DIR, name)
+        output_bytes += os.path.getsize(path)
+        os.remove(path)
+    return _summary("generate_certificates", template, size, elapsed, latencies, output_bytes)
+
+
+def bench_preview_certificate(template, size, options):
+    from flask import Flask
+    from app.routes.generate import bp
+
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    client = app.test_client()
+    payload = {"template": template, "rows": synthetic_roster(size)}
+    start = time.perf_counter()
+    resp = client.post("/generate/preview", json=payload)
+    body = resp.get_data()
+    elapsed = time.perf_counter() - start
+    if resp.status_code != 200:
+        raise RuntimeError(f"/generate/preview returned {resp.status_code}: {body[:200]!r}")
+    return _summary("preview_certificate", template, size, elapsed, output_bytes=len(body))
+
+
+CASES = {
+    "fill_slide": bench_fill_slide,
+    "generate_certificates": bench_generate_certificates,
+    "preview_certificate": bench_preview_certificate,
+}
+
+
+def compare(before_path, after_path):
+    """Print rows/sec, p99 and RSS side by side for cases present in both reports."""
+    with open(before_path, encoding="utf-8") as f:
+        before = {(r["case"], r["template"], r["rows"]): r for r in json.load(f)["results"]}
+    with open(after_path, encoding="utf-8") as f:
+        after = {(r["case"], r["template"], r["rows"]): r for r in json.load(f)["results"]}
+
+    for key in sorted(before.keys() & after.keys()):
+        b, a = before[key], after[key]
+        speedup = a["rows_per_sec"] / b["rows_per_sec"] if b["rows_per_sec"] else float("nan")
+        print(f"{key[0]:<22} {key[1]:<10} {key[2]:>6} rows  "
+              f"{b['rows_per_sec']:>9} -> {a['rows_per_sec']:>9} rows/s ({speedup:.2f}x)  "
+              f"p99 {b.get('p99_ms')} -> {a.get('p99_ms')} ms  "
+              f"rss {b['peak_rss_mb']} -> {a['peak_rss_mb']} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--templates", nargs="+", default=DEFAULT_TEMPLATES)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--options", default="{}",
+                        help='/generate/certificates request options, e.g. \'{"engine": "xml"}\'')
+    parser.add_argument("--output", default=f"bench_certificates_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two saved reports and exit")
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    options = json.loads(args.options)
+
+    results = []
+    ctx = get_context("spawn")
+    for case in args.cases:
+        for template in args.templates:
+            if not os.path.exists(os.path.join(TEMPLATE_DIR, f"{template}.pptx")):
+                print(f"[WARN] skipping missing template {template}.pptx")
+                continue
+            for size in args.sizes:
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    result = pool.submit(CASES[case], template, size, options).result()
+                results.append(result)
+                print(f"{case:<22} {template:<10} {size:>6} rows  {result['rows_per_sec']:>9} rows/s  "
+                      f"p50 {result.get('p50_ms')} ms  p99 {result.get('p99_ms')} ms  "
+                      f"rss {result['peak_rss_mb']} MB  out {result['output_bytes']}")
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": options,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,35 @@
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
-from pptx import Presentation
 from openpyxl import load_workbook
 from datetime import datetime
 import os
 import uuid
 import io
 import json
-import re
+import tempfile
 import traceback
 import requests  # <-- needed for internal HTTP calls
 
 from app.routes.auth import auth_bp
-from app.routes.generate import bp as generate_bp
+from app.routes.generate import TEMPLATE_DIR, bp as generate_bp, unmerge_report_sheets
 from app.routes.upload import upload_bp          # <-- fixed
-from app.routes.excel_generate import excel_bp
+from app.routes.excel_generate import DEFAULT_TEMPLATE_PATH, excel_bp
 from app.routes.immersion import immersion_bp
-
-from app import config
+from app.routes.jobs import jobs_bp
+from app.routes.ingestions import ingestions_bp
+
+from app.services.excel_stream import StreamingTemplateWriter, requested_engine, template_book
+from app.services.grading import grader
+from app.services.immersion_batches import batch_registry
+from app.services.immersion_records import insert_records
+from app.services.jobs import job_queue, wants_async
+from app.services.merged_cells import MergedCellIndex, merged_index_for
+from app.services.output_cache import output_cache
+from app.services.placeholders import DOUBLE_BRACE_RE, fill_paragraph
+from app.services.pptx_templates import template_cache
+from app.services.sheet_placeholders import PLACEHOLDER_RE, PlaceholderIndex, cell_context, placeholder_index_for, resolve_column
+from app.services.student_fields import StudentFields, student_value
+from app.services.workbook_templates import workbook_templates
 
 app = Flask(__name__)
 CORS(app)
@@ -26,7 +38,7 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 
 @app.after_request
 def expose_headers(resp):
-    resp.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
+    resp.headers["Access-Control-Expose-Headers"] = "Content-Disposition, X-Failed-Rows, X-Total-Rows, X-Offset, X-Returned-Rows"
     return resp
 
 BASE_DIR = os.path.dirname(__file__)
@@ -43,8 +55,14 @@ app.register_blueprint(generate_bp)
 app.register_blueprint(upload_bp)
 app.register_blueprint(excel_bp)
 app.register_blueprint(immersion_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(ingestions_bp)
+
+# Parse the Excel templates in the background so requests start from a ready copy
+workbook_templates.warm(os.path.join(UPLOAD_FOLDER, "grades2.xlsx"))
+workbook_templates.warm(os.path.join(TEMPLATE_DIR, "grades2.xlsx"), prepare=unmerge_report_sheets)
+workbook_templates.warm(DEFAULT_TEMPLATE_PATH, data_only=True)
 
-PLACEHOLDER_RE = re.compile(r"\{([^}]+)\}")
 recent_downloads = []
 
 # ---------- Utilities ----------
@@ -53,35 +71,19 @@ def format_value(val, fmt=None):
     return "" if val is None else str(val)
 
 def replace_placeholders_in_cell(text, mapping, rowdict):
-    if "YEAR LAST ATTENDED" in text.upper():
-        context = None
-        up = text.upper()
-        if "ELEMENTARY" in up:
-            context = "ELEMENTARY"
-        elif "SECONDARY" in up:
-            context = "SECONDARY"
-        elif "TERTIARY" in up:
-            context = "TERTIARY"
-    else:
-        context = None
+    context = cell_context(text)
 
     def repl(m):
-        key = m.group(1)
-        mp = mapping.get(key, key)
-        if isinstance(mp, dict):
-            col = mp.get(context) or mp.get("DEFAULT")
-        else:
-            col = mp
-        val = rowdict.get(col, "")
-        return format_value(val)
+        return format_value(rowdict.get(resolve_column(mapping, m.group(1), context), ""))
 
     return PLACEHOLDER_RE.sub(repl, text)
 
-def replace_placeholders_in_worksheet(ws, mapping, rowdict):
-    for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=ws.max_column):
-        for cell in row:
-            if isinstance(cell.value, str) and "{" in cell.value and "}" in cell.value:
-                cell.value = replace_placeholders_in_cell(cell.value, mapping, rowdict)
+def replace_placeholders_in_worksheet(ws, mapping, rowdict, index=None, template_path=None, template_ws=None):
+    # With template_path the index of the template sheet is cached per file, so copies are never rescanned
+    if index is None:
+        index = (placeholder_index_for(template_path, template_ws or ws) if template_path
+                 else PlaceholderIndex.from_worksheet(ws))
+    index.fill(ws, mapping, rowdict)
 
 def _safe_sheet_title(s: str, used: set) -> str:
     title = (s or "").strip() or "Row"
@@ -114,12 +116,9 @@ def _copy_template_sheet_with_fallback(wb, template_ws, new_title):
                     ws.cell(row=r, column=c, value=v)
         return ws
 
-def is_top_left_merged_cell(ws, row, col):
-    cell = ws.cell(row=row, column=col)
-    for merged_range in ws.merged_cells.ranges:
-        if cell.coordinate in merged_range:
-            return cell.coordinate == merged_range.start_cell.coordinate
-    return True
+def is_top_left_merged_cell(ws, row, col, index=None):
+    # Without an index the sheet's cached one is used, so repeated calls never rebuild it
+    return (index or merged_index_for(ws)).is_top_left(row, col)
 
 def to_number(val):
     try:
@@ -131,25 +130,8 @@ def to_number(val):
             return val
 
 def get_student_value(student, key):
-    if not isinstance(student, dict):
-        return None
-    nk = key.strip().lower()
-
-    for k, v in student.items():
-        if isinstance(k, str) and k.strip().lower() == nk:
-            return v
-
-    for parent in ("scores", "grades", "appraisal", "performance"):
-        pv = student.get(parent)
-        if isinstance(pv, dict):
-            val = get_student_value(pv, key)
-            if val is not None:
-                return val
-
-    for k, v in student.items():
-        if isinstance(k, str) and nk in k.strip().lower():
-            return v
-    return None
+    # Same lookup rules as before, but compiled once per distinct key layout
+    return student_value(student, key)
 
 def force_full_calc_on_load(wb):
     try:
@@ -190,15 +172,12 @@ def generate_certificates():
 
     output_path = os.path.join(output_folder, filename)
 
-    prs = Presentation(template_path)
+    prs = template_cache.get(template_path).open()
     for slide in prs.slides:
         for shape in slide.shapes:
             if shape.has_text_frame:
                 for paragraph in shape.text_frame.paragraphs:
-                    for run in paragraph.runs:
-                        if "{{" in run.text and "}}" in run.text:
-                            key = run.text.replace("{{", "").replace("}}", "").strip()
-                            run.text = data.get(key, "")
+                    fill_paragraph(paragraph, data, DOUBLE_BRACE_RE, default="")
 
     prs.save(output_path)
     return jsonify({"files": [filename]})
@@ -297,6 +276,172 @@ def update_download_history():
 
 # ---------- Internal TESDA generator + proxy ----------
 
+IMMERSION_SHEET_MAPPING = {
+    "PROD": "PRODUCTION",
+    "IT": "TECHNICAL",
+    "ACCTG": "SUPPORT",
+    "ERT": "SUPPORT",
+    "HS": "SUPPORT",
+    "HSN": "SUPPORT",
+    "ER": "SUPPORT"
+}
+
+IMMERSION_BASIC_MAPPING = {
+    "last_name": 2,     # B
+    "first_name": 3,    # C
+    "middle_name": 4,   # D
+    "strand": 5,        # E
+    "department": 6,    # F
+    "over_all": 7,      # G
+    "total_score": 30   # AD (do not write directly)
+}
+
+IMMERSION_SCORE_MAPPING = {
+    "wi": 8, "co": 9, "5s": 10, "bo": 11, "cbo": 12, "sdg": 13,
+    "ohsa": 14, "we": 15, "ujc": 16, "iso": 17, "po": 18, "hr": 19,
+    "perdev": 21, "supp": 26, "ds": 29
+}
+
+# Every field read from a student, resolved once per student into a flat record
+STUDENT_FIELDS = StudentFields(
+    ["last_name", "first_name", "name", "Name", "middle_name", "strand", "department", "over_all", "school", "batch"]
+    + list(IMMERSION_SCORE_MAPPING)
+)
+
+def iter_immersion_rows(students, records=None):
+    """Yield (sheet, row, {col: value}, {col: number_format}) per named student, rows ascending per sheet."""
+    start_rows = {sheet: 10 for sheet in ["PRODUCTION", "TECHNICAL", "SUPPORT"]}
+    if records is None:
+        records = STUDENT_FIELDS.records(students)
+
+    def has_name(rec):
+        for key in ("last_name", "first_name", "name", "Name"):
+            v = rec[key]
+            if v and str(v).strip():
+                return True
+        return False
+
+    dept_students = {}
+    for stu, rec in zip(students, records):
+        if not has_name(rec):
+            continue
+        dept = (stu.get("department") or "").strip().upper()
+        sheet_name = IMMERSION_SHEET_MAPPING.get(dept)
+        if not sheet_name:
+            continue
+        dept_students.setdefault(sheet_name, []).append(rec)
+
+    for sheet_name, rec_list in dept_students.items():
+        row_num = start_rows[sheet_name]
+        for rec in rec_list:
+            values, formats = {}, {}
+            for key, col in IMMERSION_BASIC_MAPPING.items():
+                if key == "total_score":
+                    continue
+                val = rec[key]
+                if key == "over_all":
+                    val = to_number(val)
+                values[col] = val or ""
+                if key == "over_all" and isinstance(val, (int, float)):
+                    formats[col] = '0.0'
+
+            for skey, col in IMMERSION_SCORE_MAPPING.items():
+                raw_val = rec[skey]
+                val = "" if raw_val is None else to_number(raw_val)
+                values[col] = val
+                if isinstance(val, (int, float)):
+                    formats[col] = '0'
+            yield sheet_name, row_num, values, formats
+            row_num += 1
+        start_rows[sheet_name] = row_num
+
+def build_immersion_workbook(students, template_path, progress=None, fileobj=None, failures=None):
+    """
+    Fill grades2.xlsx per department, grade every student and store them in immersion_records.
+    With fileobj the workbook is streamed there in constant memory and None is returned.
+    Records the database rejected are appended to failures when a list is given.
+    """
+    records = STUDENT_FIELDS.records(students)
+
+    if fileobj is None:
+        wb = workbook_templates.checkout(template_path)
+        merged = {}
+        for sheet_name, row_num, values, formats in iter_immersion_rows(students, records):
+            ws = wb[sheet_name]
+            if sheet_name not in merged:
+                merged[sheet_name] = MergedCellIndex.from_worksheet(ws)
+            for col, val in values.items():
+                if is_top_left_merged_cell(ws, row_num, col, merged[sheet_name]):
+                    cell = ws.cell(row=row_num, column=col, value=val)
+                    if col in formats:
+                        cell.number_format = formats[col]
+    else:
+        wb = None
+        writer = StreamingTemplateWriter(template_book(template_path))
+        sheets = {title: writer.sheet(title, skip_merged=True) for title in writer.book.sheet_names}
+        for sheet_name, row_num, values, formats in iter_immersion_rows(students, records):
+            sheets[sheet_name].write_row(row_num, values, formats)
+        writer.save(fileobj)
+
+    # --- Compute totals & grades ---
+    graded = grader.grade(records)
+    for stu, result in zip(students, graded):
+        stu.update(result)
+
+    # --- DB insert ---
+    stored = [
+        {**rec, **result} for stu, rec, result in zip(students, records, graded)
+        if any(isinstance(v, (str, int, float)) and str(v).strip() for v in stu.values())
+    ]
+
+    # Register each school/batch pair once (scalar values only: anything else is not a valid SQL parameter)
+    pairs = dict.fromkeys(
+        (rec["school"], rec["batch"]) for rec in stored
+        if isinstance(rec["school"], (str, int, float)) and isinstance(rec["batch"], (str, int, float))
+    )
+    for school, batch in pairs:
+        try:
+            batch_registry.resolve(school, batch)
+        except Exception as e:
+            app.logger.warning("Could not register batch %s / %s: %s", school, batch, e)
+
+    # Student records: one bulk transaction; rows that could not be stored are reported through failures
+    try:
+        failed = insert_records(stored, progress=progress)
+    except Exception as e:
+        failed = [{"row": i, "last_name": rec["last_name"], "first_name": rec["first_name"], "error": str(e)}
+                  for i, rec in enumerate(stored)]
+    if progress:
+        progress(len(students), len(students))
+    if failures is not None:
+        failures.extend(failed)
+    for failure in failed:
+        app.logger.warning("DB insert failed for %s, %s: %s", failure["last_name"], failure["first_name"], failure["error"])
+
+    if wb is not None:
+        force_full_calc_on_load(wb)
+    return wb
+
+def _immersion_excel_job(progress, students, template_path, cache_key, engine="openpyxl"):
+    filename = f"IMMERSION-GENERATED-{datetime.now().strftime('%Y%m%d-%H%M%S')}.xlsx"
+    output_path = os.path.join(GENERATED_FOLDER, filename)
+    failures = []
+    if engine == "stream":
+        with open(output_path, "wb") as f:
+            build_immersion_workbook(students, template_path, progress, fileobj=f, failures=failures)
+    else:
+        wb = build_immersion_workbook(students, template_path, progress, failures=failures)
+        wb.save(output_path)
+    # Only a roster stored in full is cached: a retry of one with failed rows must insert again
+    if not failures:
+        output_cache.put(cache_key, filename, source_path=output_path)
+    return {
+        "path": output_path,
+        "download_name": filename,
+        "mimetype": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "failed": failures,
+    }
+
 @app.route('/api/generate/excel', methods=['POST'])
 def generate_excel_from_json():
     try:
@@ -309,183 +454,68 @@ def generate_excel_from_json():
         if not os.path.exists(template_path):
             return jsonify({"error": f"Template not found: {template_path}"}), 404
 
-        wb = load_workbook(template_path)
-
-       
-
-        sheet_mapping = {
-            "PROD": "PRODUCTION",
-            "IT": "TECHNICAL",
-            "ACCTG": "SUPPORT",
-            "ERT": "SUPPORT",
-            "HS": "SUPPORT",
-            "HSN": "SUPPORT",
-            "ER": "SUPPORT"
-        }
-        start_rows = {sheet: 10 for sheet in ["PRODUCTION", "TECHNICAL", "SUPPORT"]}
-
-        basic_mapping = {
-            "last_name": 2,     # B
-            "first_name": 3,    # C
-            "middle_name": 4,   # D
-            "strand": 5,        # E
-            "department": 6,    # F
-            "over_all": 7,      # G
-            "total_score": 30   # AD (do not write directly)
-        }
-
-        score_mapping = {
-            "wi": 8, "co": 9, "5s": 10, "bo": 11, "cbo": 12, "sdg": 13,
-            "ohsa": 14, "we": 15, "ujc": 16, "iso": 17, "po": 18, "hr": 19,
-            "perdev": 21, "supp": 26, "ds": 29
-        }
-
-        def has_name(stu):
-            for key in ("last_name", "first_name", "name", "Name"):
-                v = get_student_value(stu, key)
-                if v and str(v).strip():
-                    return True
-            return False
-
-        # Fill Excel with student data
-        missing = []
-        dept_students = {}
-        for stu in students:
-            if not has_name(stu):
-                continue
-            dept = (stu.get("department") or "").strip().upper()
-            sheet_name = sheet_mapping.get(dept)
-            if not sheet_name:
-                continue
-            dept_students.setdefault(sheet_name, []).append(stu)
-
-        for sheet_name, stu_list in dept_students.items():
-            ws = wb[sheet_name]
-            row_num = start_rows[sheet_name]
-            for stu in [s for s in stu_list if has_name(s)]:
-                for key, col in basic_mapping.items():
-                    if key == "total_score":
-                        continue
-                    if is_top_left_merged_cell(ws, row_num, col):
-                        val = get_student_value(stu, key)
-                        if key == "over_all":
-                            val = to_number(val)
-                        ws.cell(row=row_num, column=col, value=val or "")
-                        if key == "over_all" and isinstance(val, (int, float)):
-                            ws.cell(row=row_num, column=col).number_format = '0.0'
-
-                for skey, col in score_mapping.items():
-                    raw_val = get_student_value(stu, skey)
-                    val = "" if raw_val is None else to_number(raw_val)
-                    if raw_val is None:
-                        missing.append({
-                            "row_index": row_num,
-                            "student": get_student_value(stu, "last_name") or get_student_value(stu, "first_name"),
-                            "key": skey
-                        })
-                    if is_top_left_merged_cell(ws, row_num, col):
-                        cell = ws.cell(row=row_num, column=col, value=val)
-                        if isinstance(val, (int, float)):
-                            cell.number_format = '0'
-                row_num += 1
-            start_rows[sheet_name] = row_num
-
-        # --- Compute totals & grades ---
-        written_fields = ["wi", "co", "5s", "bo", "cbo", "sdg"]
-        performance_fields = ["ohsa", "we", "ujc", "iso", "po", "hr", "perdev", "supp", "ds"]
-
-        for stu in students:
-            for key in written_fields + performance_fields:
-                val = get_student_value(stu, key) or 0
-                try:
-                    stu[key] = float(val)
-                except ValueError:
-                    stu[key] = 0.0
-
-            total_score = sum(stu[k] for k in written_fields + performance_fields)
-            stu["total_score"] = total_score
-
-            stu["written_rating"] = round(sum(stu[k] for k in written_fields) / len(written_fields), 2)
-            stu["performance_rating"] = round(sum(stu[k] for k in performance_fields) / len(performance_fields), 2)
-
-            if total_score >= 90:
-                stu["final_grade"] = "A"
-            elif total_score >= 80:
-                stu["final_grade"] = "B"
-            elif total_score >= 70:
-                stu["final_grade"] = "C"
-            elif total_score >= 60:
-                stu["final_grade"] = "D"
-            else:
-                stu["final_grade"] = "F"
-
-            stu["remarks"] = "Passed" if stu["final_grade"] != "F" else "Failed"
-
-        # --- DB insert ---
-        for stu in students:
-            if not any(isinstance(v, (str, int, float)) and str(v).strip() for v in stu.values()):
-                continue
-            try:
-                # NEW: Insert school + batch into immersion_batches if not exists
-                school = get_student_value(stu, "school")
-                batch = get_student_value(stu, "batch")
-
-                if school and batch:
-                    row = config.fetch_one(
-                        "SELECT id FROM immersion_batches WHERE school=%s AND batch=%s",
-                        (school, batch)
-                    )
-                    if not row:
-                        config.execute_query(
-                            "INSERT INTO immersion_batches (school, batch) VALUES (%s, %s)",
-                            (school, batch)
-                        )
-
-                # Insert student record
-                config.execute_query("""
-                    INSERT INTO immersion_records (
-                        last_name, first_name, middle_name, strand, department,
-                        WI, CO, 5S, BO, CBO, SDG,
-                        OHSA, WE, UJC, ISO, PO, HR,
-                        PERDEV, SUPP, DS,
-                        total_score, written_rating, performance_rating, final_grade, remarks
-                    )
-                    VALUES (
-                        %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s,
-                        %s, %s, %s, %s, %s
-                    )
-                """, (
-                    get_student_value(stu, "last_name"),
-                    get_student_value(stu, "first_name"),
-                    get_student_value(stu, "middle_name"),
-                    get_student_value(stu, "strand"),
-                    get_student_value(stu, "department"),
-
-                    int(stu["wi"]), int(stu["co"]), int(stu["5s"]), int(stu["bo"]), int(stu["cbo"]), int(stu["sdg"]),
-                    int(stu["ohsa"]), int(stu["we"]), int(stu["ujc"]), int(stu["iso"]), int(stu["po"]), int(stu["hr"]),
-                    int(stu["perdev"]), int(stu["supp"]), int(stu["ds"]),
-
-                    float(stu["total_score"]), float(stu["written_rating"]), float(stu["performance_rating"]),
-                    stu["final_grade"], stu["remarks"]
-                ))
-            except Exception as e:
-                print(f"❌ DB insert failed for student {stu}: {e}")
+        filename = f"IMMERSION-GENERATED-{datetime.now().strftime('%Y%m%d-%H%M%S')}.xlsx"
+
+        # Same roster again: serve the earlier workbook without regenerating or re-inserting rows.
+        # Only rosters whose rows were all stored are cached, so a hit never hides a failed insert.
+        engine = requested_engine(request)
+        cache_type = "immersion_excel" if engine == "openpyxl" else f"immersion_excel:{engine}"
+        cache_key = output_cache.key(template_path, cache_type, students)
+        cached = output_cache.get(cache_key)
+        if cached:
+            resp = send_file(
+                cached["path"],
+                mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                as_attachment=True,
+                download_name=filename
+            )
+            resp.headers["X-Failed-Rows"] = "0"
+            return resp
+
+        if wants_async(request):
+            job_id = job_queue.submit(
+                "immersion_excel", _immersion_excel_job, students, template_path, cache_key, engine,
+                total=len(students)
+            )
+            return jsonify({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+
+        if engine == "stream":
+            # Spool to disk instead of holding the workbook; serve it from the cache entry
+            failures = []
+            spool = tempfile.TemporaryFile()
+            build_immersion_workbook(students, template_path, fileobj=spool, failures=failures)
+            spool.seek(0)
+            source = spool
+            if not failures:
+                with spool:
+                    source = output_cache.put(cache_key, filename, fileobj=spool)["path"]
+            resp = send_file(
+                source,
+                mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                as_attachment=True,
+                download_name=filename
+            )
+            resp.headers["X-Failed-Rows"] = str(len(failures))
+            return resp
+
+        failures = []
+        wb = build_immersion_workbook(students, template_path, failures=failures)
 
         # Return file
-        force_full_calc_on_load(wb)
         output = io.BytesIO()
         wb.save(output)
+        if not failures:
+            output_cache.put(cache_key, filename, data=output.getvalue())
         output.seek(0)
-        filename = f"IMMERSION-GENERATED-{datetime.now().strftime('%Y%m%d-%H%M%S')}.xlsx"
-        return send_file(
+        resp = send_file(
             output,
             mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             as_attachment=True,
             download_name=filename
         )
+        # Students the database rejected; the workbook itself is complete
+        resp.headers["X-Failed-Rows"] = str(len(failures))
+        return resp
 
     except Exception as e:
         traceback.print_exc()
@@ -0,0 +1,115 @@
+# backend/tests/conftest.py
+"""
+Shared fixtures. app.config opens a MySQL pool when it is imported, so an
+in-memory stand-in is installed as app.config before any app module loads.
+
+    cd backend
+    python -m pytest
+"""
+import io, os, sys, tempfile, types
+
+import pytest
+from openpyxl import Workbook
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Job state and cached outputs go to a scratch directory, not backend/static
+_scratch = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_scratch, "jobs.db"))
+os.environ.setdefault("OUTPUT_CACHE_DIR", os.path.join(_scratch, "outputs"))
+
+
+class FakeDb:
+    """The app.config functions the services call, answered from memory; every statement is recorded."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.queries = []
+        self.uploads = {}
+        self.inserted = []
+        self._next_id = 0
+
+    def execute_query(self, query, params=None, fetch=False, **kwargs):
+        self.queries.append((query, params))
+        if "INSERT INTO uploads" in query:
+            self.uploads[(params[0], params[1])] = params[5]
+        return [] if fetch else None
+
+    def fetch_one(self, query, params=None):
+        self.queries.append((query, params))
+        if "FROM uploads" in query:
+            result = self.uploads.get(tuple(params))
+            return {"result": result} if result is not None else None
+        return None
+
+    def execute_many(self, query, rows, chunk_size=500, progress=None):
+        rows = list(rows)
+        self.queries.append((query, rows))
+        if "immersion_records" in query:
+            self.inserted.extend(rows)
+        if progress and rows:
+            progress(len(rows), len(rows))
+        return {"written": len(rows), "failed": []}
+
+    def execute_insert(self, query, params=None):
+        self.queries.append((query, params))
+        self._next_id += 1
+        return self._next_id
+
+    def get_db_connection(self):
+        return None
+
+
+fake_db = FakeDb()
+
+_config = types.ModuleType("app.config")
+for _name in ("execute_query", "fetch_one", "execute_many", "execute_insert", "get_db_connection"):
+    setattr(_config, _name, getattr(fake_db, _name))
+
+import app  # noqa: E402
+
+sys.modules["app.config"] = app.config = _config
+# routes/auth.py imports the same file as a top-level "config" module
+sys.modules["config"] = _config
+
+
+@pytest.fixture
+def db():
+    fake_db.reset()
+    yield fake_db
+    fake_db.reset()
+
+
+def roster_xlsx(students=50, school="Sample School", batch="Batch 1") -> bytes:
+    """An immersion roster as uploaded: school/batch in F1/G1, one student per row from row 10."""
+    wb = Workbook()
+    ws = wb.active
+    ws["F1"], ws["G1"] = school, batch
+    for i in range(students):
+        row = [f"Last{i}", f"First{i}", "M", "STEM", ("PRODUCTION", "TECHNICAL", "SUPPORT")[i % 3]]
+        row += [(i + k) % 11 for k in range(15)]
+        for col, value in enumerate(row, start=1):
+            ws.cell(row=10 + i, column=col, value=value)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def tesda_template(tmp_path):
+    """A one-sheet TESDA-style template with a name, a grade and a context-mapped placeholder."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Template"
+    ws["A1"] = "Name: {NAME}"
+    ws["A2"] = "Grade: {GRADE}"
+    ws["A3"] = "Elementary: {ELEMENTARY}"
+    ws["B3"] = "Year Last Attended: {YEAR LAST ATTENDED - ELEMENTARY}"
+    ws.merge_cells("C1:D1")
+    path = tmp_path / "template.xlsx"
+    wb.save(path)
+    return str(path)
@@ -0,0 +1,55 @@
+import io, os, zipfile
+
+import pytest
+from lxml import etree
+from pptx import Presentation
+
+from app.services.certificate_decks import build_deck, merge_decks, render_parallel
+from app.services.pptx_fastpath import get_xml_template
+from app.services.pptx_templates import APP_PROPERTIES, template_cache
+
+TEMPLATE = os.path.join(os.path.dirname(__file__), "..", "uploads", "templates", "ojt.pptx")
+EXTENDED = "{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}"
+
+ROWS = [
+    {"Name": f"Trainee {i} & Co", "School": "Sample School", "Course": "ICT",
+     "Hours": str(80 + i), "Date": "June 1, 2024"}
+    for i in range(7)
+]
+
+
+def _slide_texts(prs):
+    return [[shape.text_frame.text for shape in slide.shapes if shape.has_text_frame] for slide in prs.slides]
+
+
+def _app_slide_count(blob: bytes) -> int:
+    with zipfile.ZipFile(io.BytesIO(blob)) as zf:
+        return int(etree.fromstring(zf.read(APP_PROPERTIES)).find(f"{EXTENDED}Slides").text)
+
+
+@pytest.fixture
+def expected():
+    """Slide text of the reference deck, filled slide by slide with fill_slide."""
+    return _slide_texts(build_deck(template_cache.get(TEMPLATE), ROWS))
+
+
+def _merged() -> bytes:
+    out = io.BytesIO()
+    merge_decks(render_parallel(TEMPLATE, ROWS, workers=1, chunk_size=3), out)
+    return out.getvalue()
+
+
+def _fast_path() -> bytes:
+    out = io.BytesIO()
+    get_xml_template(template_cache.get(TEMPLATE)).write_deck(ROWS, out)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("render", [_merged, _fast_path], ids=["merged", "fast_path"])
+def test_deck_has_one_slide_per_row(render, expected):
+    blob = render()
+    prs = Presentation(io.BytesIO(blob))
+
+    assert len(prs.slides) == len(ROWS)
+    assert _app_slide_count(blob) == len(ROWS)
+    assert _slide_texts(prs) == expected
@@ -0,0 +1,111 @@
+import importlib.util, os
+
+import pytest
+
+mysql_connector = pytest.importorskip("mysql.connector")
+pytest.importorskip("dotenv")
+from mysql.connector import pooling  # noqa: E402
+
+from conftest import BACKEND_DIR  # noqa: E402
+
+BAD, DOWN = "bad", "down"
+
+
+class FakeConnection:
+    """A pooled connection whose cursor rejects rows tagged BAD (row error) or DOWN (server error)."""
+
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.log)
+
+    def start_transaction(self):
+        self.log.append("begin")
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def _check(self, params):
+        if params and params[0] == DOWN:
+            raise mysql_connector.OperationalError("Lost connection to MySQL server")
+        if params and params[0] == BAD:
+            raise mysql_connector.IntegrityError("Duplicate entry")
+
+    def execute(self, query, params=None):
+        self._check(params)
+        self.log.append(("execute", params))
+
+    def executemany(self, query, rows):
+        for params in rows:
+            self._check(params)
+        self.log.append(("executemany", list(rows)))
+
+    def fetchone(self):
+        return (2,)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db_config(monkeypatch):
+    """app/config.py loaded on its own, with the MySQL pool replaced by FakeConnections."""
+    log = []
+
+    class FakePool:
+        def __init__(self, **kwargs):
+            pass
+
+        def get_connection(self):
+            return FakeConnection(log)
+
+    monkeypatch.setattr(pooling, "MySQLConnectionPool", FakePool)
+    spec = importlib.util.spec_from_file_location("db_config_under_test", os.path.join(BACKEND_DIR, "app", "config.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    log.clear()
+    return module, log
+
+
+def test_a_rejected_chunk_is_retried_row_by_row(db_config):
+    config, log = db_config
+    rows = [("ok", i) for i in range(7)]
+    rows[4] = (BAD, 4)
+    progress = []
+
+    result = config.execute_many("INSERT", rows, chunk_size=3, progress=lambda done, total: progress.append(done))
+
+    assert result == {"written": 6, "failed": [{"index": 4, "error": "Duplicate entry"}]}
+    assert log == [
+        "begin",
+        ("executemany", rows[0:3]),
+        ("execute", rows[3]), ("execute", rows[5]),
+        ("executemany", rows[6:7]),
+        "commit",
+    ]
+    assert progress == [3, 6, 7]
+
+
+def test_other_errors_roll_the_batch_back(db_config):
+    config, log = db_config
+    with pytest.raises(mysql_connector.OperationalError):
+        config.execute_many("INSERT", [("ok", 1), (DOWN, 2)], chunk_size=1)
+    assert log == ["begin", ("executemany", [("ok", 1)]), "rollback"]
+
+
+def test_no_rows_needs_no_connection(db_config):
+    config, log = db_config
+    assert config.execute_many("INSERT", []) == {"written": 0, "failed": []}
+    assert log == []
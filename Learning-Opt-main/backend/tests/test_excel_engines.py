@@ -0,0 +1,53 @@
+import io
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from app.routes.generate import build_immersion_report, stream_immersion_report
+from app.services.excel_filler import ExcelTemplateFiller
+
+STUDENTS = [
+    {"last_name": f"Last{i}", "first_name": f"First{i}", "middle_name": "M", "strand": "STEM",
+     "department": ("PROD", "TECHNICAL", "IT", "SUPPORT", "")[i % 5],
+     **{f"{g}G": str((i + g) % 11) for g in range(1, 18)}}
+    for i in range(40)
+]
+STUDENTS[3]["5G"] = "n/a"  # left as text
+
+
+def _contents(data: bytes):
+    """Sheet order, cell values and merged ranges: what either engine must agree on."""
+    wb = load_workbook(io.BytesIO(data))
+    return [
+        (ws.title,
+         {c.coordinate: c.value for row in ws.iter_rows() for c in row if c.value is not None},
+         sorted(str(r) for r in ws.merged_cells.ranges))
+        for ws in wb.worksheets
+    ]
+
+
+def test_immersion_report_engines_agree():
+    out = io.BytesIO()
+    build_immersion_report(STUDENTS).save(out)
+    streamed = io.BytesIO()
+    stream_immersion_report(STUDENTS, streamed)
+    assert _contents(streamed.getvalue()) == _contents(out.getvalue())
+
+
+def test_template_filler_engines_agree(tesda_template):
+    details = [{"NAME": f"Trainee {i}", "ELEMENTARY": f"School {i}", "YEAR LAST ATTENDED": 2010 + i} for i in range(12)]
+    grades = [{"NAME": f"Trainee {i}", "GRADE": 75 + i} for i in range(0, 12, 2)]
+
+    def generate(engine):
+        buf = io.BytesIO()
+        with pd.ExcelWriter(buf) as writer:
+            pd.DataFrame(details).to_excel(writer, sheet_name="details", index=False)
+            pd.DataFrame(grades).to_excel(writer, sheet_name="grades", index=False)
+        buf.seek(0)
+        out, _ = ExcelTemplateFiller(tesda_template).generate_from_filestorage(buf, engine=engine)
+        out.seek(0)
+        return out.read()
+
+    expected = _contents(generate("openpyxl"))
+    assert len(expected) == 12
+    assert _contents(generate("stream")) == expected
@@ -0,0 +1,44 @@
+import io
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from app.services.excel_filler import ExcelTemplateFiller
+
+
+def _upload(details, grades):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as writer:
+        pd.DataFrame(details).to_excel(writer, sheet_name="details", index=False)
+        pd.DataFrame(grades).to_excel(writer, sheet_name="grades", index=False)
+    buf.seek(0)
+    return buf
+
+
+def _sheets(out):
+    wb = load_workbook(out)
+    return {ws.title: {c.coordinate: c.value for row in ws.iter_rows() for c in row if c.value is not None}
+            for ws in wb.worksheets}
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "stream"])
+def test_normalized_match_keeps_the_details_spelling(tesda_template, engine):
+    upload = _upload(
+        [{"NAME": "Trainee 11", "ELEMENTARY": "Central ES"}],
+        [{"NAME": "trainee  11", "GRADE": "90"}],
+    )
+    filler = ExcelTemplateFiller(tesda_template)
+    out, _ = filler.generate_from_filestorage(upload, normalize_names=True, engine=engine)
+
+    cells = _sheets(out)["Trainee 11"]
+    assert cells["A1"] == "Name: Trainee 11"
+    assert cells["A2"] == "Grade: 90"
+    assert cells["A3"] == "Elementary: Central ES"
+
+
+def test_exact_match_leaves_differently_spelled_names_ungraded(tesda_template):
+    upload = _upload([{"NAME": "Trainee 11"}], [{"NAME": "trainee  11", "GRADE": "90"}])
+    out, _ = ExcelTemplateFiller(tesda_template).generate_from_filestorage(upload)
+    assert _sheets(out)["Trainee 11"]["A2"] == "Grade: "
+
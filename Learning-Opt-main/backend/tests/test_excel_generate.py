@@ -0,0 +1,70 @@
+import io, time
+
+import pandas as pd
+import pytest
+from flask import Flask
+from openpyxl import load_workbook
+
+from app.routes.excel_generate import excel_bp
+from app.services.jobs import job_queue
+
+DETAILS = [{"NAME": f"Trainee {i}", "ELEMENTARY": f"School {i}"} for i in range(5)]
+GRADES = [{"NAME": f"Trainee {i}", "GRADE": str(80 + i)} for i in reversed(range(5))]
+
+
+def _csv(rows):
+    return io.BytesIO(pd.DataFrame(rows).to_csv(index=False).encode())
+
+
+def _xlsx():
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as writer:
+        pd.DataFrame(DETAILS).to_excel(writer, sheet_name="details", index=False)
+        pd.DataFrame(GRADES).to_excel(writer, sheet_name="grades", index=False)
+    buf.seek(0)
+    return buf
+
+
+@pytest.fixture
+def client(tesda_template, tmp_path, monkeypatch):
+    # Outputs are written under static/generated relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    app = Flask(__name__, root_path=str(tmp_path))
+    app.EXCEL_TEMPLATE_PATH = tesda_template
+    app.register_blueprint(excel_bp)
+    return app.test_client()
+
+
+def _sheet_values(data):
+    wb = load_workbook(io.BytesIO(data))
+    return [(ws.title, [[c.value for c in row] for row in ws.iter_rows()]) for ws in wb.worksheets]
+
+
+def test_csv_pair_matches_the_workbook_upload_and_is_cached(client):
+    expected = client.post("/api/generate", data={"file": (_xlsx(), "roster.xlsx")})
+    assert expected.status_code == 200
+
+    for _ in range(2):
+        r = client.post("/api/generate", data={"file": (_csv(DETAILS), "roster.csv"), "grades": (_csv(GRADES), "g.csv")})
+        assert r.status_code == 200
+        assert _sheet_values(r.data) == _sheet_values(expected.data)
+
+
+def test_csv_pair_without_grades_is_rejected(client):
+    r = client.post("/api/generate", data={"file": (_csv(DETAILS), "roster.csv")})
+    assert r.status_code == 400
+
+
+def test_async_job_reads_the_uploads_after_the_request(client):
+    expected = client.post("/api/generate", data={"file": (_xlsx(), "roster.xlsx")})
+    r = client.post("/api/generate", data={"file": (_csv(DETAILS), "async.csv"), "grades": (_csv(GRADES), "g.csv"),
+                                           "async": "1", "mapping": '{"GRADE": "GRADE"}'})  # a new cache key
+    assert r.status_code == 202
+
+    job_id = r.get_json()["job_id"]
+    deadline = time.time() + 30
+    while (job := job_queue.store.get(job_id))["status"] not in ("done", "failed") and time.time() < deadline:
+        time.sleep(0.05)
+    assert job["status"] == "done", job
+    with open(job["result_path"], "rb") as f:
+        assert _sheet_values(f.read()) == _sheet_values(expected.data)
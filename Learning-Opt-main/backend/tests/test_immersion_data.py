@@ -0,0 +1,53 @@
+import pytest
+from flask import Flask
+
+import app.routes.immersion as immersion
+from app.services.json_rows import json_rows
+
+ROWS = [{"LAST_NAME": f"Last{i}", "FIRST_NAME": f"First{i}", "TOTAL": i} for i in range(10)]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    path = str(tmp_path / "uploaded_data.json")
+    monkeypatch.setattr(immersion, "UPLOAD_JSON_PATH", path)
+    json_rows.write(path, ROWS)
+    app = Flask(__name__)
+    app.register_blueprint(immersion.immersion_bp, url_prefix="/immersion")
+    return app.test_client()
+
+
+def test_pages_and_projection(client):
+    r = client.get("/immersion/data?offset=2&limit=3&fields=LAST_NAME")
+    assert r.get_json() == {"rows": [{"LAST_NAME": "Last2"}, {"LAST_NAME": "Last3"}, {"LAST_NAME": "Last4"}]}
+    assert r.headers["X-Total-Rows"] == "10"
+    assert r.headers["X-Returned-Rows"] == "3"
+    assert client.get("/immersion/data").get_json() == {"rows": ROWS}
+
+
+def test_each_variant_has_its_own_etag(client):
+    etags = {
+        query: client.get(f"/immersion/data{query}").headers["ETag"]
+        for query in ("", "?limit=3", "?offset=3&limit=3", "?limit=3&fields=LAST_NAME")
+    }
+    assert len(set(etags.values())) == len(etags)
+
+    first_page = etags["?limit=3"]
+    assert client.get("/immersion/data?limit=3", headers={"If-None-Match": first_page}).status_code == 304
+    # Another page never revalidates against the first page's ETag
+    assert client.get("/immersion/data?offset=3&limit=3", headers={"If-None-Match": first_page}).status_code == 200
+    # Same variant, spelled the way it is normalized
+    assert client.get("/immersion/data?offset=0&limit=3&fields=", headers={"If-None-Match": first_page}).status_code == 304
+
+
+def test_a_new_upload_changes_every_etag(client):
+    before = client.get("/immersion/data?limit=3").headers["ETag"]
+    json_rows.write(immersion.UPLOAD_JSON_PATH, ROWS[::-1])
+    r = client.get("/immersion/data?limit=3", headers={"If-None-Match": before})
+    assert r.status_code == 200
+    assert r.get_json()["rows"][0]["LAST_NAME"] == "Last9"
+
+
+@pytest.mark.parametrize("query", ["limit=x", "offset=1.5", "limit=-1"])
+def test_bad_paging_is_rejected(client, query):
+    assert client.get(f"/immersion/data?{query}").status_code == 400
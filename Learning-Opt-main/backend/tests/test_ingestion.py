@@ -0,0 +1,60 @@
+import io, json, time
+
+import pytest
+from flask import Flask
+
+import app.routes.immersion as immersion
+from app.routes.ingestions import ingestions_bp
+from app.routes.upload import upload_bp
+from app.services.ingestion import SpooledRows
+from conftest import roster_xlsx
+
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(immersion, "UPLOAD_JSON_PATH", str(tmp_path / "uploaded_data.json"))
+    app = Flask(__name__)
+    app.register_blueprint(upload_bp)
+    app.register_blueprint(immersion.immersion_bp, url_prefix="/immersion")
+    app.register_blueprint(ingestions_bp)
+    return app.test_client()
+
+
+def _post(client, path, data, **form):
+    return client.post(path, data={"file": (io.BytesIO(data), "roster.xlsx"), "force": "1", **form})
+
+
+def _wait(client, response):
+    assert response.status_code == 202, response.get_json()
+    url = response.get_json()["status_url"]
+    deadline = time.time() + 30
+    while (status := client.get(url).get_json())["status"] not in ("done", "failed") and time.time() < deadline:
+        time.sleep(0.05)
+    return status
+
+
+@pytest.mark.parametrize("path", ["/upload", "/immersion/fill-template"])
+def test_async_ingestion_gives_the_sync_response(client, db, path):
+    data = roster_xlsx(120)
+    sync = _post(client, path, data).get_json()
+    written = open(immersion.UPLOAD_JSON_PATH).read() if "fill" in path else None
+    inserted = list(db.inserted)
+
+    db.inserted.clear()
+    status = _wait(client, _post(client, path, data, **{"async": "1"}))
+    assert status["status"] == "done", status["error"]
+    assert status["persisted"] == 120
+    assert status["result"] == json.loads(json.dumps(sync))
+    assert db.inserted == inserted
+    if written is not None:
+        assert open(immersion.UPLOAD_JSON_PATH).read() == written
+
+
+def test_spooled_rows_are_read_back_from_disk():
+    rows = SpooledRows()
+    rows.extend([{"a": 1, "b": "x"}, {"a": 2.5, "b": None}])
+    rows.extend([{"a": 3, "b": "z"}])
+    assert len(rows) == 3
+    assert list(rows) == [{"a": 1, "b": "x"}, {"a": 2.5, "b": None}, {"a": 3, "b": "z"}]
+    assert [row["a"] for row in rows] == [1, 2.5, 3]
+    rows.close()
@@ -0,0 +1,41 @@
+from openpyxl import Workbook
+
+from app.services.merged_cells import MergedCellIndex, merged_index_for
+
+
+def _scan_is_top_left(ws, row, col):
+    # The per-cell scan the index replaces
+    coordinate = ws.cell(row=row, column=col).coordinate
+    for merged_range in ws.merged_cells.ranges:
+        if coordinate in merged_range:
+            return coordinate == merged_range.start_cell.coordinate
+    return True
+
+
+def _sheet():
+    ws = Workbook().active
+    for rng in ("A1:C1", "B3:D5", "F2:F9", "H8:I8"):
+        ws.merge_cells(rng)
+    return ws
+
+
+def test_index_agrees_with_a_scan():
+    ws = _sheet()
+    index = MergedCellIndex.from_worksheet(ws)
+    for row in range(1, 12):
+        for col in range(1, 12):
+            assert index.is_top_left(row, col) == _scan_is_top_left(ws, row, col), (row, col)
+    assert index.anchor(4, 3) == (3, 2)
+    assert index.anchor(4, 5) is None
+
+
+def test_sheet_index_is_reused_until_the_merges_change():
+    ws = _sheet()
+    index = merged_index_for(ws)
+    assert merged_index_for(ws) is index
+    assert not index.is_top_left(1, 2)
+
+    ws.unmerge_cells("A1:C1")
+    rebuilt = merged_index_for(ws)
+    assert rebuilt is not index
+    assert rebuilt.is_top_left(1, 2)
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask
+
+import app.routes.generate as generate
+from app.services.output_cache import OutputCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return OutputCache(str(tmp_path / "outputs"), 1 << 20)
+
+
+def _touch(path, data: bytes, mtime: float):
+    with open(path, "wb") as f:
+        f.write(data)
+    os.utime(path, (mtime, mtime))
+
+
+def test_key_follows_the_template_file(cache, tmp_path):
+    template = tmp_path / "template.pptx"
+    _touch(template, b"first", 1_000_000)
+    first = cache.key(str(template), "ojt", [{"NAME": "A"}])
+    assert cache.key(str(template), "ojt", [{"NAME": "A"}]) == first
+    assert cache.key(str(template), "ojt", [{"NAME": "B"}]) != first
+
+    # Same size, new contents and mtime: the template is hashed again
+    _touch(template, b"other", 1_000_100)
+    changed = cache.key(str(template), "ojt", [{"NAME": "A"}])
+    assert changed != first
+
+    # Back to the original bytes: back to the original key
+    _touch(template, b"first", 1_000_200)
+    assert cache.key(str(template), "ojt", [{"NAME": "A"}]) == first
+
+
+def test_concurrent_keys_agree(cache, tmp_path):
+    template = tmp_path / "template.pptx"
+    _touch(template, b"x" * 100_000, 1_000_000)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        keys = set(pool.map(lambda i: cache.key(str(template), "ojt", {"row": 1}), range(64)))
+    assert len(keys) == 1
+
+
+def test_certificate_cache_is_kept_apart_per_engine_and_parallel(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(generate, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(generate, "output_cache", cache)
+    app = Flask(__name__)
+    app.register_blueprint(generate.bp)
+    client = app.test_client()
+    rows = [{"NAME": f"Trainee {i}"} for i in range(3)]
+
+    def post(**options):
+        r = client.post("/generate/certificates", json={"template": "ojt", "rows": rows, **options})
+        assert r.status_code == 200, r.get_json()
+        return r.get_json().get("cached", False)
+
+    assert not post()
+    assert not post(engine="xml")
+    assert not post(parallel=True, workers=1)
+    assert post()
+    assert post(engine="xml")
+    assert post(parallel=True, workers=1)
@@ -0,0 +1,64 @@
+import csv, io
+
+import pytest
+from openpyxl import load_workbook
+
+from app.services.roster_reader import ROSTER_COLUMNS, ROSTER_WIDTH, RosterCsvReader, RosterReader, open_roster
+from conftest import roster_xlsx
+
+
+def _read(source, filename):
+    with open_roster(source, filename, min_width=ROSTER_WIDTH) as roster:
+        return roster.school, roster.batch, list(roster.rows())
+
+
+def _csv(lines) -> io.BytesIO:
+    text = io.StringIO()
+    csv.writer(text).writerows(lines)
+    return io.BytesIO(text.getvalue().encode("utf-8-sig"))
+
+
+def _sheet_lines(data: bytes):
+    """The roster sheet as 'Save as CSV' writes it: every cell of every row, blanks as empty fields."""
+    ws = load_workbook(io.BytesIO(data)).active
+    return [["" if v is None else v for v in row] for row in ws.iter_rows(values_only=True)]
+
+
+@pytest.fixture
+def roster():
+    data = roster_xlsx(25, school="Sample School", batch="Batch 7")
+    return data, _read(io.BytesIO(data), "roster.xlsx")
+
+
+def test_open_roster_picks_the_reader_by_extension():
+    data = roster_xlsx(1)
+    assert isinstance(open_roster(io.BytesIO(data), "ROSTER.XLSX"), RosterReader)
+    assert isinstance(open_roster(_csv(_sheet_lines(data)), "Roster.CSV"), RosterCsvReader)
+
+
+def test_sheet_layout_reads_like_the_workbook(roster):
+    data, expected = roster
+    assert expected[:2] == ("Sample School", "Batch 7")
+    assert len(expected[2]) == 25
+    assert _read(_csv(_sheet_lines(data)), "roster.csv") == expected
+
+
+def test_header_layout_reads_like_the_workbook(roster):
+    data, expected = roster
+    students = _sheet_lines(data)[9:]
+    # An export with a header row and school/batch repeated on each line
+    header = list(ROSTER_COLUMNS) + ["school", "batch"]
+    lines = [header] + [row + ["Sample School", "Batch 7"] for row in students]
+    assert _read(_csv(lines), "roster.csv") == expected
+
+
+def test_header_layout_leaves_missing_columns_blank():
+    school, batch, rows = _read(_csv([["last_name", "first_name", "wi"], ["Cruz", "Ana", "9"]]), "roster.csv")
+    assert (school, batch) == ("", "")
+    assert rows == [("Cruz", "Ana", None, None, None, 9) + (None,) * (ROSTER_WIDTH - 6)]
+
+
+def test_csv_reader_leaves_the_stream_open():
+    source = _csv([["last_name"], ["Cruz"]])
+    _read(source, "roster.csv")
+    assert not source.closed
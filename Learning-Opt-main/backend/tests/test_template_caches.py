@@ -0,0 +1,65 @@
+import io, os, shutil
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from pptx import Presentation
+from pptx.util import Inches
+
+from app.services.excel_filler import ExcelTemplateFiller
+from app.services.pptx_fastpath import get_xml_template
+from app.services.pptx_templates import template_cache
+
+OJT_TEMPLATE = os.path.join(os.path.dirname(__file__), "..", "uploads", "templates", "ojt.pptx")
+
+
+def _bump_mtime(path, seconds=10):
+    """Move the file's mtime forward, as a save would (and past coarse filesystem timestamps)."""
+    mtime = os.path.getmtime(path) + seconds
+    os.utime(path, (mtime, mtime))
+
+
+def _fill(template_path, engine):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as writer:
+        pd.DataFrame([{"NAME": "Trainee 1"}]).to_excel(writer, sheet_name="details", index=False)
+        pd.DataFrame([{"NAME": "Trainee 1", "GRADE": "88"}]).to_excel(writer, sheet_name="grades", index=False)
+    buf.seek(0)
+    out, _ = ExcelTemplateFiller(template_path).generate_from_filestorage(buf, engine=engine)
+    ws = load_workbook(out)["Trainee 1"]
+    return ws["A1"].value, ws["A2"].value
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "stream"])
+def test_edited_excel_template_is_reloaded(tesda_template, engine):
+    assert _fill(tesda_template, engine) == ("Name: Trainee 1", "Grade: 88")
+
+    wb = load_workbook(tesda_template)
+    wb.active["A1"] = "Trainee: {NAME}"
+    wb.active["A2"] = "Final grade: {GRADE}"
+    wb.save(tesda_template)
+    _bump_mtime(tesda_template)
+
+    assert _fill(tesda_template, engine) == ("Trainee: Trainee 1", "Final grade: 88")
+
+
+def test_edited_pptx_template_is_recompiled(tmp_path):
+    path = str(tmp_path / "ojt.pptx")
+    shutil.copyfile(OJT_TEMPLATE, path)
+    first = template_cache.get(path)
+    assert template_cache.get(path) is first
+    assert "Remarks" not in first.keys
+
+    prs = Presentation(path)
+    prs.slides[0].shapes.add_textbox(Inches(1), Inches(1), Inches(3), Inches(1)).text_frame.text = "{Remarks}"
+    prs.save(path)
+    _bump_mtime(path)
+
+    edited = template_cache.get(path)
+    assert edited is not first
+    assert "Remarks" in edited.keys
+
+    out = io.BytesIO()
+    get_xml_template(edited).write_deck([{"Name": "A", "Remarks": "With honors"}], out)
+    texts = [shape.text_frame.text for shape in Presentation(out).slides[0].shapes if shape.has_text_frame]
+    assert "With honors" in texts
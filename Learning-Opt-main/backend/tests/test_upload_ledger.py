@@ -0,0 +1,78 @@
+import io, json
+
+import pytest
+from flask import Flask
+
+import app.routes.immersion as immersion
+from app import config
+from app.routes.upload import upload_bp
+from conftest import roster_xlsx
+
+ROUTES = ["/upload", "/immersion/fill-template"]
+
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(immersion, "UPLOAD_JSON_PATH", str(tmp_path / "uploaded_data.json"))
+    app = Flask(__name__)
+    app.register_blueprint(upload_bp)
+    app.register_blueprint(immersion.immersion_bp, url_prefix="/immersion")
+    return app.test_client()
+
+
+def _post(client, path, data, **form):
+    return client.post(path, data={"file": (io.BytesIO(data), "roster.xlsx"), **form})
+
+
+@pytest.mark.parametrize("path", ROUTES)
+def test_repeat_upload_is_answered_from_the_ledger(client, db, path):
+    data = roster_xlsx(30, batch=f"Batch {path}")
+    first = _post(client, path, data).get_json()
+    assert "duplicate" not in first
+    assert len(db.inserted) == 30
+
+    db.inserted.clear()
+    again = _post(client, path, data).get_json()
+    assert again.pop("duplicate") is True
+    assert again == json.loads(json.dumps(first, default=str))
+    assert db.inserted == []
+
+    if path != "/upload":
+        # The frontend's copy is rewritten from the stored rows
+        with open(immersion.UPLOAD_JSON_PATH) as f:
+            assert json.load(f) == again["rows"]
+
+
+@pytest.mark.parametrize("path", ROUTES)
+@pytest.mark.parametrize("force", ["1", "true"])
+def test_force_reprocesses_a_known_file(client, db, path, force):
+    data = roster_xlsx(12)
+    _post(client, path, data)
+
+    db.inserted.clear()
+    forced = _post(client, path, data, force=force).get_json()
+    assert "duplicate" not in forced
+    assert len(db.inserted) == 12
+
+
+def test_ledger_is_keyed_by_route(client, db):
+    data = roster_xlsx(5)
+    _post(client, "/upload", data)
+    r = _post(client, "/immersion/fill-template", data).get_json()
+    assert "duplicate" not in r
+    assert len(db.uploads) == 2
+
+
+def test_upload_with_failed_rows_is_not_recorded(client, db, monkeypatch):
+    def execute_many(query, rows, chunk_size=500, progress=None):
+        rows = list(rows)
+        return {"written": len(rows) - 1, "failed": [{"index": 0, "error": "Duplicate entry"}]}
+
+    monkeypatch.setattr(config, "execute_many", execute_many)
+    data = roster_xlsx(8)
+    first = _post(client, "/upload", data).get_json()
+    assert first["failed"]
+    assert db.uploads == {}
+
+    # The retry is processed again rather than answered with the partial result
+    assert "duplicate" not in _post(client, "/upload", data).get_json()
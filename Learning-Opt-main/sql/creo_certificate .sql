@@ -44,6 +44,88 @@ INSERT INTO tesda_records (title) VALUES
   ('TESDA NC II: Animation'),
   ('TESDA NC II: Electrical Installation');
 
+--
+-- Table structure for table `immersion_batches`
+--
+-- One row per school/batch pair. The unique key lets the backend register a
+-- pair with a single INSERT ... ON DUPLICATE KEY UPDATE instead of SELECT + INSERT.
+--
+
+CREATE TABLE IF NOT EXISTS `immersion_batches` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `school` varchar(255) NOT NULL,
+  `batch` varchar(100) NOT NULL,
+  `created_at` datetime DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_school_batch` (`school`, `batch`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+--
+-- Existing databases: drop duplicate pairs (keeping the oldest id), then add the key
+--
+-- DELETE b1 FROM `immersion_batches` b1
+--   JOIN `immersion_batches` b2 ON b1.school = b2.school AND b1.batch = b2.batch AND b1.id > b2.id;
+-- ALTER TABLE `immersion_batches` ADD UNIQUE KEY `uq_school_batch` (`school`, `batch`);
+--
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `immersion_records`
+--
+
+CREATE TABLE IF NOT EXISTS `immersion_records` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `last_name` varchar(100) DEFAULT NULL,
+  `first_name` varchar(100) DEFAULT NULL,
+  `middle_name` varchar(100) DEFAULT NULL,
+  `strand` varchar(100) DEFAULT NULL,
+  `department` varchar(100) DEFAULT NULL,
+  `WI` int(11) DEFAULT 0,
+  `CO` int(11) DEFAULT 0,
+  `5S` int(11) DEFAULT 0,
+  `BO` int(11) DEFAULT 0,
+  `CBO` int(11) DEFAULT 0,
+  `SDG` int(11) DEFAULT 0,
+  `OHSA` int(11) DEFAULT 0,
+  `WE` int(11) DEFAULT 0,
+  `UJC` int(11) DEFAULT 0,
+  `ISO` int(11) DEFAULT 0,
+  `PO` int(11) DEFAULT 0,
+  `HR` int(11) DEFAULT 0,
+  `PERDEV` int(11) DEFAULT 0,
+  `SUPP` int(11) DEFAULT 0,
+  `DS` int(11) DEFAULT 0,
+  `total_score` float DEFAULT 0,
+  `written_rating` float DEFAULT 0,
+  `performance_rating` float DEFAULT 0,
+  `final_grade` varchar(2) DEFAULT NULL,
+  `remarks` varchar(20) DEFAULT NULL,
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `uploads`
+--
+-- Ledger of processed roster files, one row per file content (sha256) and route.
+-- A repeat upload is answered with the stored result instead of inserting again.
+--
+
+CREATE TABLE IF NOT EXISTS `uploads` (
+  `content_hash` char(64) NOT NULL,
+  `kind` varchar(20) NOT NULL,
+  `school` varchar(255) DEFAULT NULL,
+  `batch` varchar(100) DEFAULT NULL,
+  `row_count` int(11) DEFAULT 0,
+  `result` longtext NOT NULL,
+  `created_at` datetime DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`content_hash`, `kind`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Table structure for table `credential_tbl`
 --